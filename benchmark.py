@@ -0,0 +1,268 @@
+"""Benchmarks for the three parsers
+
+Runs sequent.Chart, tlg_parser.Chart and chart_parser.Chart over the bundled sentence files, the test sentences of the
+modules, and series of sentences that grow in length, number of quantifiers and lexical ambiguity. Each case records
+its wall time, peak memory, the nodes the parser built and the readings it found. python benchmark.py --save writes
+the results as a baseline, and python benchmark.py --baseline compares a run with it, exiting with status 1 if any case
+regressed (python benchmark.py --help for the options)."""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import chart_parser
+import sequent
+import tlg_parser
+
+
+# types and categories of other words, added to each word of a sentence for the ambiguity series
+sequentdistractors = ['n', 'dp/n', 'pp/dp', 'q/(dp\\s)', 'dp\\dp', '(dp\\s)/s', 's/(dp\\s)', '(dp\\inf)/(dp\\s)']
+tlgdistractors = ['n', 'dp/n', 'dp\\dp', '(dp\\s)/s', 's/(dp\\s)', 's\\s', 'n\\n', '(dp\\s)/dp']
+cfgdistractors = ['D', 'A', 'N', 'V', 'P', 'Aux', 'NP', 'PP']
+
+
+# a benchmark case: one parser over a list of sentences
+# parse takes a sentence and gives back the number of nodes the parser built for it and the number of its readings
+class Case:
+
+    def __init__(self, name, parse, sentences):
+        self.name = name
+        self.parse = parse
+        self.sentences = sentences
+
+    def run(self):
+        nodes = 0
+        readings = 0
+        for sentence in self.sentences:
+            sentencenodes, sentencereadings = self.parse(sentence)
+            nodes += sentencenodes
+            readings += sentencereadings
+        return nodes, readings
+
+    # the fastest of repeat runs, and the peak memory of one more run (traced apart, since tracing slows it down)
+    def measure(self, repeat=3):
+        times = []
+        for run in range(repeat):
+            start = time.perf_counter()
+            nodes, readings = self.run()
+            times.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            self.run()
+            memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {'time': min(times), 'memory': memory, 'nodes': nodes, 'readings': readings}
+
+
+# the nodes of sequent.Chart are the sequents it proved (or spans it linked), and its readings the distinct
+# denotations of the sentence
+def sequentparser(lexicon, **settings):
+    def parse(sentence):
+        chart = sequent.Chart.parse(lexicon, sentence, sequent.ParseContext(**settings))
+        return chart.context.nodecount, len(chart.readings())
+    return parse
+
+
+# the nodes of tlg_parser.Chart are its constituents, and its readings the parses of the sentence as s
+def tlgparser(lexicon):
+    def parse(sentence):
+        chart = tlg_parser.Chart.parse(lexicon, sentence)
+        return len(chart.constituents), chart.countparses()
+    return parse
+
+
+# the nodes of chart_parser.Chart are its constituents and arcs, and its readings the parses of the sentence as S
+def cfgparser(lexicon, grammar):
+    def parse(sentence):
+        chart = chart_parser.Chart.parse(lexicon, grammar, sentence)
+        return len(chart.constituents) + len(chart.arcs), chart.countparses()
+    return parse
+
+
+# the sentences of a file; the sentence files also hold notes, headings and lexicon entries, so with a lexicon only the
+# lines whose words are all in it are kept (a question mark at the end is not a word, see sequent.Chart.parse)
+def readsentences(filename, lexicon=None):
+    with open(filename, 'r', encoding='utf-8') as sentencefile:
+        sentences = [line.strip() for line in sentencefile.read().split('\n') if line.strip() != '']
+    if lexicon is None:
+        return sentences
+    return [sentence for sentence in sentences
+            if len(lexicon.unknownwords(sentence.rstrip('?？').split(' '))) == 0]
+
+
+# the lexicon text of a sentence with count more entries for each of its words, taken from distractors in turn
+def addsequentdistractors(lexiconstring, sentence, count):
+    lines = [lexiconstring]
+    for word in sentence.split(' '):
+        for index in range(count):
+            distractor = sequentdistractors[index % len(sequentdistractors)]
+            lines.append('{} : {} - {}{}'.format(word, distractor, word, index))
+    return '\n'.join(lines)
+
+
+def addtlgdistractors(lexiconstring, sentence, count):
+    lines = [lexiconstring]
+    for word in sentence.split(' '):
+        for index in range(count):
+            distractor = tlgdistractors[index % len(tlgdistractors)]
+            lines.append('{} : {} - {}{}'.format(word, distractor, word, index))
+    return '\n'.join(lines)
+
+
+def addcfgdistractors(lexicon, sentence, count):
+    for word in set(sentence.split(' ')):
+        lexicon.entries[word] = lexicon.entries[word] + [cfgdistractors[index % len(cfgdistractors)]
+                                                         for index in range(count)]
+    return lexicon
+
+
+# the cases of the sequent parser: every bundled sentence file of each language, and the scaling series
+# (the series are in English, and sizes are kept where the full search takes at most about a second; the proof-net
+# engine, whose table of spans grows polynomially with the sentence, runs the length series further)
+def sequentcases(settings):
+    cases = []
+    for language in 'english', 'japanese', 'chinese':
+        lexicon = sequent.Lexicon.from_file(sequent.lexiconpath(language))
+        sentencefilename = sequent.sentencepath(language)
+        for filename in sentencefilename, sentencefilename.replace('_sentences.txt', '_sentence_storage.txt'):
+            sentences = readsentences(filename, lexicon)
+            if len(sentences) > 0:
+                name = filename.replace('\\', '/').split('/')[-1][:-len('.txt')]
+                cases.append(Case('sequent corpus ' + name, sequentparser(lexicon, **settings), sentences))
+
+    lexiconfilename = sequent.lexiconpath('english')
+    lexicon = sequent.Lexicon.from_file(lexiconfilename)
+    proofnets = settings.get('engine') == 'proofnet'
+    for size in list(range(1, 9)) + ([12, 16, 20, 24] if proofnets else []):
+        cases.append(Case('sequent length adverbs {}'.format(size), sequentparser(lexicon, **settings),
+                          ['john saw mary' + ' softly' * size]))
+    for size in list(range(1, 5)) + ([6, 8] if proofnets else []):
+        cases.append(Case('sequent length coordination {}'.format(size), sequentparser(lexicon, **settings),
+                          [' and '.join(['john left'] * size)]))
+    for size in range(1, 6):
+        cases.append(Case('sequent quantifiers {}'.format(size), sequentparser(lexicon, **settings),
+                          [' '.join(['everyone saidthat'] * (size - 1) + ['someone saw everyone'])]))
+    with open(lexiconfilename, 'r', encoding='utf-8') as lexiconfile:
+        lexiconstring = lexiconfile.read()
+    sentence = 'john saw mary softly'
+    for size in range(0, 9, 2):
+        ambiguouslexicon = sequent.Lexicon(addsequentdistractors(lexiconstring, sentence, size))
+        cases.append(Case('sequent ambiguity {}'.format(size), sequentparser(ambiguouslexicon, **settings),
+                          [sentence]))
+    return cases
+
+
+# the cases of the Lambek elimination parser, with its test lexicon (the bundled lexicons are written for the sequent
+# parser)
+def tlgcases():
+    lexicon = tlg_parser.Lexicon(tlg_parser.testlexiconstring)
+    cases = [Case('tlg test sentences', tlgparser(lexicon), tlg_parser.testsentences)]
+    for size in range(5, 41, 5):
+        cases.append(Case('tlg length adverbs {}'.format(size), tlgparser(lexicon),
+                          ['kevin snores' + ' faintly' * size]))
+    for size in range(4, 21, 4):
+        cases.append(Case('tlg quantifiers {}'.format(size), tlgparser(lexicon),
+                          [' '.join(['everyone knowsthat'] * (size - 1) + ['everyone snores'])]))
+    sentence = 'everyone knowsthat kevin snores faintly'
+    for size in range(0, 9, 2):
+        ambiguouslexicon = tlg_parser.Lexicon(addtlgdistractors(tlg_parser.testlexiconstring, sentence, size))
+        cases.append(Case('tlg ambiguity {}'.format(size), tlgparser(ambiguouslexicon), [sentence]))
+    return cases
+
+
+# the cases of the context free parser, with its test grammar and lexicon; a context free grammar has no quantifiers,
+# so its length series is of prepositional phrases, whose attachments multiply the parses
+def cfgcases():
+    grammar = chart_parser.Grammar(chart_parser.grammarstring).compile()
+    lexicon = chart_parser.Lexicon(chart_parser.lexiconstring)
+    cases = [Case('cfg test sentences', cfgparser(lexicon, grammar), chart_parser.testsentences)]
+    for size in range(3, 16, 3):
+        cases.append(Case('cfg length attachments {}'.format(size), cfgparser(lexicon, grammar),
+                          ['John saw Bob' + ' on the boat' * size]))
+    sentence = 'the old man man the boat on the water'
+    for size in range(0, 9, 2):
+        ambiguouslexicon = addcfgdistractors(chart_parser.Lexicon(chart_parser.lexiconstring), sentence, size)
+        cases.append(Case('cfg ambiguity {}'.format(size), cfgparser(ambiguouslexicon, grammar), [sentence]))
+    return cases
+
+
+# the regressions of a run against a baseline, as (case, message); a case regresses if its readings changed, or if its
+# nodes, time or memory grew by more than threshold (a fraction of the baseline), where a growth in time below
+# mintime seconds or in memory below minmemory bytes is taken as noise
+# cases that are not in the baseline are not compared
+def findregressions(results, baseline, threshold=0.25, mintime=0.005, minmemory=65536):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['readings'] != base['readings']:
+            regressions.append((name, 'readings {} instead of {}'.format(result['readings'], base['readings'])))
+        for measure, minimum in ('nodes', 0), ('time', mintime), ('memory', minmemory):
+            if result[measure] > base[measure] * (1 + threshold) and result[measure] - base[measure] > minimum:
+                regressions.append((name, '{} {:.4g} instead of {:.4g}'.format(measure, result[measure],
+                                                                               base[measure])))
+    return regressions
+
+
+def main(arguments=None):
+    argumentparser = argparse.ArgumentParser(description='Benchmark the three parsers.')
+    argumentparser.add_argument('--parsers', nargs='+', choices=['sequent', 'tlg', 'cfg'],
+                                default=['sequent', 'tlg', 'cfg'], help='parsers to benchmark (default: all)')
+    argumentparser.add_argument('--only', help='only run the cases whose name contains this')
+    argumentparser.add_argument('--repeat', type=int, default=3, help='runs of each case, of which the fastest counts')
+    argumentparser.add_argument('--qrlimit', type=int, default=1, help='qr limit of the sequent parser')
+    argumentparser.add_argument('--engine', choices=['sequent', 'proofnet'], default='sequent',
+                                help='engine of the sequent parser')
+    argumentparser.add_argument('--focused', action='store_true', help='use the focused search of the sequent parser')
+    argumentparser.add_argument('--save', help='file to write the results to, as a baseline')
+    argumentparser.add_argument('--baseline', help='baseline file to compare the results with')
+    argumentparser.add_argument('--threshold', type=float, default=0.25,
+                                help='growth in nodes, time or memory, as a fraction of the baseline, that is a '
+                                     'regression')
+    options = argumentparser.parse_args(arguments)
+
+    # results are only comparable with a baseline made with the same settings
+    settings = {'qrlimit': options.qrlimit, 'engine': options.engine, 'focused': options.focused}
+    baseline = None
+    if options.baseline is not None:
+        with open(options.baseline, 'r', encoding='utf-8') as baselinefile:
+            baseline = json.load(baselinefile)
+        if baseline['settings'] != settings:
+            argumentparser.error('the baseline was made with {}, not {}'.format(baseline['settings'], settings))
+
+    cases = []
+    if 'sequent' in options.parsers:
+        cases += sequentcases(settings)
+    if 'tlg' in options.parsers:
+        cases += tlgcases()
+    if 'cfg' in options.parsers:
+        cases += cfgcases()
+    if options.only is not None:
+        cases = [case for case in cases if options.only in case.name]
+
+    results = {}
+    print('{:40} {:>10} {:>10} {:>10} {:>10}'.format('case', 'seconds', 'kilobytes', 'nodes', 'readings'))
+    for case in cases:
+        result = results[case.name] = case.measure(options.repeat)
+        print('{:40} {:10.4f} {:10.1f} {:10} {:10}'.format(case.name, result['time'], result['memory'] / 1024,
+                                                          result['nodes'], result['readings']))
+
+    if options.save is not None:
+        with open(options.save, 'w', encoding='utf-8') as savefile:
+            json.dump({'settings': settings, 'cases': results}, savefile, indent=1, sort_keys=True)
+    if baseline is not None:
+        regressions = findregressions(results, baseline['cases'], options.threshold)
+        for name, message in regressions:
+            print('regression:', name, message)
+        print(len(regressions), 'regressions in', len(results), 'cases')
+        if len(regressions) > 0:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,33 @@
-from collections import defaultdict
+"""Chart parser for context free grammars
+
+Load a grammar and lexicon (directly or with from_file) and parse with Chart.parse; nothing is parsed when the module
+is imported. Run the module to parse sentences with the test grammar (python chart_parser.py --help for the options)."""
+
+from collections import defaultdict, deque
+from itertools import product
+import argparse
+import pickle
 
 
 # Grammar is a collection of rules
+# the chart parses with the compiled grammar, made once by compile
 class Grammar:
 
     def __init__(self, rulesinput):
         self.rulelist = []
         for item in rulesinput.split('\n'):
             self.rulelist.append(Rule(item))
+        self.compiled = None
+
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename, 'r', encoding='utf-8') as grammarfile:
+            return cls(grammarfile.read().strip('\n'))
+
+    def compile(self):
+        if self.compiled is None:
+            self.compiled = CompiledGrammar(self)
+        return self.compiled
 
     def print(self):
         for rule in self.rulelist:
@@ -16,18 +36,126 @@ class Grammar:
 
 # Rule is a rewrite rule, with the nonterminal to be rewritten on the left
 # and the nonterminals and terminals (simply called terminals) rewriting on the right
+# a rule with nothing on the right (A ->) makes its nonterminal nullable
 class Rule:
 
     def __init__(self, stringinput):
         arrowindex = stringinput.index('->')
         self.nonterminal = stringinput[:arrowindex].strip()
-        self.terminals = stringinput[arrowindex + 2:].strip().split(' ')
+        self.terminals = stringinput[arrowindex + 2:].split()
         self.length = len(self.terminals)
 
     def print(self):
         print(self.nonterminal + ' -> ' + ' '.join(self.terminals))
 
 
+# CompiledGrammar is a grammar as the chart uses it: every category is a number (an index into symbols), and every rule
+# is a number (an index into lhs and rhs), with the rules indexed by their first category in rulesbyfirst
+# empty rules are taken out, by adding each rule again without each combination of its nullable categories, and rules
+# longer than two are made binary with intermediate categories for their beginnings, shared between rules: NP -> D A N
+# becomes <D A> -> D A and NP -> <D A> N; intermediate categories are left out of trees
+# a compiled grammar can be saved to a file and loaded, without the rules being read and compiled again
+class CompiledGrammar:
+
+    version = 1
+
+    def __init__(self, grammar=None):
+        self.symbols = []  # the name of each category
+        self.symbolids = {}  # the number of each category
+        self.isintermediate = []  # for each category, whether it was made by binarization
+        self.nullable = []  # for each category, whether it can be empty (in the grammar before compiling)
+        self.lhs = []  # the category each rule rewrites
+        self.rhs = []  # the categories each rule rewrites to, one or two of them
+        self.rulesbyfirst = []  # for each category, the rules that start with it
+        if grammar is not None:
+            self.compilerules(grammar.rulelist)
+
+    def symbol(self, name, intermediate=False):
+        symbol = self.symbolids.get(name)
+        if symbol is None:
+            symbol = self.symbolids[name] = len(self.symbols)
+            self.symbols.append(name)
+            self.isintermediate.append(intermediate)
+            self.nullable.append(False)
+            self.rulesbyfirst.append([])
+        return symbol
+
+    def compilerules(self, rulelist):
+        for rule in rulelist:
+            self.symbol(rule.nonterminal)
+            for terminal in rule.terminals:
+                self.symbol(terminal)
+
+        # a category is nullable if some rule rewrites it to nullable categories only
+        changed = True
+        while changed:
+            changed = False
+            for rule in rulelist:
+                if not self.nullable[self.symbolids[rule.nonterminal]] and \
+                        all(self.nullable[self.symbolids[terminal]] for terminal in rule.terminals):
+                    self.nullable[self.symbolids[rule.nonterminal]] = True
+                    changed = True
+
+        compiledrules = set()
+        for rule in rulelist:
+            # keep or leave out each nullable category
+            choices = [[[terminal], []] if self.nullable[self.symbolids[terminal]] else [[terminal]]
+                       for terminal in rule.terminals]
+            for choice in product(*choices):
+                terminals = [terminal for chosen in choice for terminal in chosen]
+                if len(terminals) > 0:
+                    self.addrule(rule.nonterminal, terminals, compiledrules)
+
+    def addrule(self, nonterminal, terminals, compiledrules):
+        first = self.symbol(terminals[0])
+        for position in range(1, len(terminals) - 1):
+            beginning = self.symbol('<' + ' '.join(terminals[:position + 1]) + '>', True)
+            if (beginning, (first, self.symbolids[terminals[position]])) not in compiledrules:
+                compiledrules.add((beginning, (first, self.symbolids[terminals[position]])))
+                self.lhs.append(beginning)
+                self.rhs.append((first, self.symbolids[terminals[position]]))
+                self.rulesbyfirst[first].append(len(self.lhs) - 1)
+            first = beginning
+        lhs = self.symbolids[nonterminal]
+        if len(terminals) == 1:
+            rhs = (first,)
+        else:
+            rhs = (first, self.symbolids[terminals[-1]])
+        if (lhs, rhs) not in compiledrules:
+            compiledrules.add((lhs, rhs))
+            self.lhs.append(lhs)
+            self.rhs.append(rhs)
+            self.rulesbyfirst[first].append(len(self.lhs) - 1)
+
+    def save(self, filename):
+        with open(filename, 'wb') as grammarfile:
+            pickle.dump((self.version, self.symbols, self.isintermediate, self.nullable, self.lhs, self.rhs),
+                        grammarfile, pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, 'rb') as grammarfile:
+            contents = pickle.load(grammarfile)
+        if contents[0] != cls.version:
+            raise Exception('Compiled grammar version {} cannot be loaded, expected {}'.format(contents[0],
+                                                                                               cls.version))
+        compiled = cls()
+        version, symbols, isintermediate, nullable, compiled.lhs, compiled.rhs = contents
+        for symbol in range(len(symbols)):
+            compiled.symbol(symbols[symbol], isintermediate[symbol])
+            compiled.nullable[symbol] = nullable[symbol]
+        for rule in range(len(compiled.lhs)):
+            compiled.rulesbyfirst[compiled.rhs[rule][0]].append(rule)
+        return compiled
+
+    def printrule(self, rule):
+        print(self.symbols[self.lhs[rule]] + ' -> ' + ' '.join(self.symbols[symbol] for symbol in self.rhs[rule]))
+
+    def print(self):
+        for rule in range(len(self.lhs)):
+            self.printrule(rule)
+
+
 # Lexicon is a collection of entries of the possible categories of a word
 class Lexicon:
 
@@ -37,62 +165,144 @@ class Lexicon:
             colonindex = entry.index(':')
             self.entries[entry[:colonindex].strip()] = entry[colonindex + 1:].replace(' ', '').split(',')
 
+    @classmethod
+    def from_file(cls, filename):
+        with open(filename, 'r', encoding='utf-8') as lexiconfile:
+            return cls(lexiconfile.read().strip('\n'))
+
     def print(self):
         for entry in self.entries:
             print(entry + ' : ' + ', '.join(self.entries[entry]))
 
     def getentries(self, word):
-        return self.entries[word]
+        return self.entries.get(word, [])
 
 
 # Chart is defined by the lexicon, grammar, and a sentence to be parsed
 # it creates a list of constituents, agenda, and arcs
+# the chart is a left corner parser: a constituent starts an arc for each rule whose first category it is, and advances
+# the arcs that are waiting for its category where it starts; arcs are indexed by the position and category they are
+# waiting for, so no arc is looked at that does not need the constituent
+# there is one constituent for each category and span, and one arc for each rule, span, and position in the rule; a
+# second way of making one of them only adds a back-pointer to it, so ambiguity is packed and the parse is cubic
+# the grammar can be a Grammar or a CompiledGrammar; rules and categories are looked up by their numbers
+# words are read one at a time with feed, and every constituent and arc a word adds ends after it, so what ends at a
+# position never changes once it is read: the chart can be asked after each word which categories span what it has
+# read so far, and a snapshot can share the cells of the positions read with the chart it was made from
 class Chart:
 
-    def __init__(self, lexicon, grammar, sentence):
+    def __init__(self, lexicon, grammar, sentence=None):
         self.lexicon = lexicon
-        self.grammar = grammar
-        self.words = sentence.split(' ')
-        self.agenda = []
-        self.arcs = []
-        self.constituents = []
+        if isinstance(grammar, Grammar):
+            self.grammar = grammar.compile()
+        else:
+            self.grammar = grammar
+        self.words = []
+        self.agenda = deque()
+        self.cells = [{}]  # for each end position, each constituent ending there by (start, category)
+        self.byend = [[]]  # for each end position, the constituents ending there, but for intermediate ones
+        self.arcsbyend = [[]]
+        # each arc ending at the current position, by (rule, start, position in rule); every arc made while a word is
+        # read ends after it, so the arcs of earlier positions are not needed to find an arc again
+        self.arctable = {}
+        # for each position, the unfinished arcs ending there by the number of the category they wait for
+        self.waiting = [defaultdict(list)]
         self.position = 0
 
-        while self.position < len(self.words):
-            self.interpretword()
-            while len(self.agenda) > 0:
-                self.addconstituent(self.agenda[0])
-                self.agenda.pop(0)
-            self.position += 1
+        if sentence is not None:
+            for word in sentence.split(' '):
+                self.feed(word)
+
+    @classmethod
+    def parse(cls, lexicon, grammar, sentence):
+        return cls(lexicon, grammar, sentence)
+
+    # reads one more word, adding the constituents and arcs that end after it
+    def feed(self, word):
+        self.words.append(word)
+        self.cells.append({})
+        self.byend.append([])
+        self.arcsbyend.append([])
+        self.waiting.append(defaultdict(list))
+        self.arctable = {}
+        self.interpretword()
+        while len(self.agenda) > 0:
+            self.addconstituent(self.agenda.popleft())
+        self.position += 1
+
+    # a chart with the words read so far, which can be fed apart from this one
+    def snapshot(self):
+        chart = Chart(self.lexicon, self.grammar)
+        chart.words = list(self.words)
+        chart.cells = list(self.cells)
+        chart.byend = list(self.byend)
+        chart.arcsbyend = list(self.arcsbyend)
+        chart.waiting = list(self.waiting)
+        chart.position = self.position
+        return chart
+
+    # every constituent (but for intermediate ones) and every arc, in the order they were made
+    @property
+    def constituents(self):
+        return [constituent for constituents in self.byend for constituent in constituents]
+
+    @property
+    def arcs(self):
+        return [arc for arcs in self.arcsbyend for arc in arcs]
+
+    # the constituents from start to the last word read, so with start 0 those spanning everything read so far
+    def spanning(self, start=0):
+        return [constituent for constituent in self.byend[self.position] if constituent.start == start]
 
     def interpretword(self):
         categorylist = self.lexicon.getentries(self.words[self.position])
         for category in categorylist:
-            self.agenda.append(Constituent(category, self.position, self.position + 1))
+            # a category the grammar does not have gets no number, and combines with nothing
+            self.addanalysis(category, self.grammar.symbolids.get(category), self.position, self.position + 1, None)
+
+    # adds an analysis (a finished arc, or None for a word) to the constituent of its category and span; a new
+    # constituent goes on the agenda
+    def addanalysis(self, category, symbol, start, end, analysis):
+        constituent = self.cells[end].get((start, category))
+        if constituent is None:
+            constituent = self.cells[end][(start, category)] = Constituent(category, start, end, symbol,
+                                                                           symbol is not None and
+                                                                           self.grammar.isintermediate[symbol])
+            self.agenda.append(constituent)
+        constituent.analyses.append(analysis)
 
     def addconstituent(self, constituent):
         # add constituent
-        self.constituents.append(constituent)
+        if not constituent.intermediate:
+            self.byend[constituent.end].append(constituent)
+        if constituent.symbol is None:
+            return
 
         # add arcs
-        for rule in self.grammar.rulelist:
-            if constituent.category == rule.terminals[0]:
-                self.arcs.append(Arc(rule, constituent.start))
+        for rule in self.grammar.rulesbyfirst[constituent.symbol]:
+            self.advancearc(rule, constituent.start, 0, None, constituent)
 
         # advance arcs
-        for arc in self.arcs:
-            # make sure the constituent is in the right position and the constituent is of the right type
-            if constituent.start == arc.current and constituent.category == arc.rule.terminals[arc.positioninrule]:
-                if arc.positioninrule == arc.rule.length - 1:
-                    self.agenda.append(Constituent(arc.rule.nonterminal, arc.start, arc.current + constituent.length))
-                    self.agenda[-1].subconstituents = arc.constituents + [constituent]
-                    '''arc.positioninrule += 1
-                    arc.current += constituent.length
-                    arc.constituents.append(constituent)'''
-                else:
-                    self.arcs.append(Arc(arc.rule, arc.start, arc.current + constituent.length, arc.positioninrule + 1,
-                                     arc.constituents + [constituent]))
-        # add completed arcs as constituent
+        # every arc here is at the start of the constituent and waiting for its category
+        for arc in self.waiting[constituent.start].get(constituent.symbol, ()):
+            self.advancearc(arc.rule, arc.start, arc.positioninrule, arc, constituent)
+
+    # the arc made by advancing an arc (or, with no arc, starting a rule) over a constituent
+    def advancearc(self, rule, start, positioninrule, arc, constituent):
+        key = (rule, start, positioninrule + 1)
+        newarc = self.arctable.get(key)
+        if newarc is None:
+            newarc = self.arctable[key] = Arc(rule, start, constituent.end, positioninrule + 1)
+            self.arcsbyend[constituent.end].append(newarc)
+            # add completed arcs as constituent
+            rhs = self.grammar.rhs[rule]
+            if newarc.positioninrule == len(rhs):
+                lhs = self.grammar.lhs[rule]
+                self.addanalysis(self.grammar.symbols[lhs], lhs, start, constituent.end, newarc)
+            else:
+                self.waiting[constituent.end][rhs[newarc.positioninrule]].append(newarc)
+        newarc.previousarcs.append(arc)
+        newarc.advancedover.append(constituent)
 
     def printconstituents(self):
         for constituent in self.constituents:
@@ -100,80 +310,169 @@ class Chart:
 
     def printarcs(self):
         for arc in self.arcs:
-            arc.print()
+            arc.print(self.grammar)
 
     def print(self):
         self.printconstituents()
         self.printarcs()
         self.printstructure()
 
+    # the number of parses of the whole sentence as a category, without unpacking them
+    def countparses(self, category='S'):
+        constituent = self.cells[len(self.words)].get((0, category))
+        if constituent is None:
+            return 0
+        return constituent.countparses()
+
     def printstructure(self, maxwordlength=6):
         for constituent in self.constituents:
             if constituent.category == 'S':
-                # constituent.printlayers()
-                chartstructure = constituent.returnchart(0, [], maxwordlength)
-                for line in chartstructure:
-                    print(line)
-                for word in self.words:
-                    print(word + ' ' * (maxwordlength - len(word)), end=' ')
-                print('\n')
+                for tree in constituent.trees():
+                    # tree.printlayers()
+                    chartstructure = tree.returnchart(0, [], maxwordlength)
+                    for line in chartstructure:
+                        print(line)
+                    for word in self.words:
+                        print(word + ' ' * (maxwordlength - len(word)), end=' ')
+                    print('\n')
 
 
 # Constituent is an element of the agenda (to be considered) and chart (finalized)
+# it stands for every analysis of its category over its span: the finished arcs that made it, or None for a word
+# symbol is the number of its category in the compiled grammar; the constituent of an intermediate category is not
+# part of the chart, and is only used by the constituents made from it
+# constituents, arcs and trees have __slots__, since a long sentence has very many of them
 class Constituent:
 
-    def __init__(self, category, startposition, endposition):
+    __slots__ = ('category', 'symbol', 'intermediate', 'start', 'length', 'end', 'analyses', 'parsecount')
+
+    def __init__(self, category, startposition, endposition, symbol=None, intermediate=False):
         self.category = category
+        self.symbol = symbol
+        self.intermediate = intermediate
         self.start = startposition
         self.length = endposition - startposition
         self.end = endposition
-        self.subconstituents = []
+        self.analyses = []
+        self.parsecount = None
 
     def print(self):
         print(self.category + ' ' + str(self.start) + ':' + str(self.end))
 
+    # the number of parses, without unpacking them
+    def countparses(self):
+        if self.parsecount is None:
+            self.parsecount = sum(1 if analysis is None else analysis.countparses() for analysis in self.analyses)
+        return self.parsecount
+
+    # every parse in turn, as a tree
+    def trees(self):
+        for subtrees in self.subtreelists():
+            yield Tree(self, subtrees)
+
+    # the subtrees of every parse in turn
+    def subtreelists(self):
+        for analysis in self.analyses:
+            if analysis is None:
+                yield []
+            else:
+                for subconstituents in analysis.sequences():
+                    yield from combinetrees(subconstituents)
+
+
+# one parse of a constituent, with the parses of the constituents it was made from
+class Tree:
+
+    __slots__ = ('constituent', 'subtrees')
+
+    def __init__(self, constituent, subtrees=None):
+        self.constituent = constituent
+        if subtrees is None:
+            self.subtrees = []
+        else:
+            self.subtrees = subtrees
+
+    def print(self):
+        self.constituent.print()
+
     def returnchart(self, layer=0, lines=None, maxwordlength=6):
         if lines is None:
             lines = []
-        dashlength = (maxwordlength + 1) * (self.end - self.start) - 1 - len(self.category)
+        constituent = self.constituent
+        dashlength = (maxwordlength + 1) * (constituent.end - constituent.start) - 1 - len(constituent.category)
         if len(lines) < layer + 1:
             lines.append('')
-        while len(lines[layer]) < self.start * (maxwordlength + 1):
+        while len(lines[layer]) < constituent.start * (maxwordlength + 1):
             lines[layer] += ' ' * (maxwordlength + 1)
-        lines[layer] += self.category + '-' * dashlength + ' '
-        for subconstituent in self.subconstituents:
-            subconstituent.returnchart(layer + 1, lines)
+        lines[layer] += constituent.category + '-' * dashlength + ' '
+        for subtree in self.subtrees:
+            subtree.returnchart(layer + 1, lines)
         if layer == 0:
             return lines
 
     def printlayers(self):
         self.print()
-        for subconstituent in self.subconstituents:
-            subconstituent.printlayers()
-
-
+        for subtree in self.subtrees:
+            subtree.printlayers()
+
+
+# every combination of one tree for each of the constituents; an intermediate constituent gives the subtrees of its
+# parses instead, so that trees have the rules of the grammar before it was made binary
+def combinetrees(constituents):
+    if len(constituents) == 0:
+        yield []
+    elif constituents[0].intermediate:
+        for subtrees in constituents[0].subtreelists():
+            for othertrees in combinetrees(constituents[1:]):
+                yield subtrees + othertrees
+    else:
+        for tree in constituents[0].trees():
+            for othertrees in combinetrees(constituents[1:]):
+                yield [tree] + othertrees
+
+
+# an arc is a rule (its number in the compiled grammar) that has found its first categories (positioninrule of them)
+# from start to current
+# each back-pointer is the arc it was advanced from (None for the first category) and the constituent it was advanced
+# over, so arcs share the constituents they were made from instead of copying them; the two halves of the back-pointers
+# are kept in two lists, with no object for each back-pointer
 class Arc:
 
-    def __init__(self, rule, startposition, currentposition=0, positioninrule=0, constituents=None):
+    __slots__ = ('rule', 'start', 'current', 'positioninrule', 'previousarcs', 'advancedover', 'parsecount')
+
+    def __init__(self, rule, startposition, currentposition, positioninrule):
         self.rule = rule
         self.start = startposition
-        if currentposition == 0:
-            self.current = self.start
-        else:
-            self.current = currentposition
+        self.current = currentposition
         self.positioninrule = positioninrule
-        if constituents is None:
-            self.constituents = []
-        else:
-            self.constituents = constituents
-
-    def print(self):
-        print(self.rule.nonterminal + ' -> ' + str(self.start), end=' ')
+        self.previousarcs = []
+        self.advancedover = []
+        self.parsecount = None
+
+    # every list of constituents the arc was made from
+    def sequences(self):
+        for arc, constituent in zip(self.previousarcs, self.advancedover):
+            if arc is None:
+                yield [constituent]
+            else:
+                for sequence in arc.sequences():
+                    yield sequence + [constituent]
+
+    def countparses(self):
+        if self.parsecount is None:
+            self.parsecount = 0
+            for arc, constituent in zip(self.previousarcs, self.advancedover):
+                self.parsecount += (1 if arc is None else arc.countparses()) * constituent.countparses()
+        return self.parsecount
+
+    def print(self, grammar):
+        rhs = [grammar.symbols[symbol] for symbol in grammar.rhs[self.rule]]
+        print(grammar.symbols[grammar.lhs[self.rule]] + ' -> ' + str(self.start), end=' ')
         for i in range(self.positioninrule):
-            print(self.rule.terminals[i], end=' ')
+            print(rhs[i], end=' ')
         print(self.current, end=' ')
-        for i in range(self.positioninrule, len(self.rule.terminals)):
-            print(self.rule.terminals[i], end=' ')
+        for i in range(self.positioninrule, len(rhs)):
+            print(rhs[i], end=' ')
         print('\n', end='')
 
 
@@ -201,20 +500,55 @@ men : N
 boat : N
 on : P"""
 
-testgrammar = Grammar(grammarstring)
-# testgrammar.print()
-# print()
-
-testlexicon = Lexicon(lexiconstring)
-# testlexicon.print()
-# print()
+testsentences = ['the old man man the boat on the water', 'the old can hold water']
+
+
+def main(arguments=None):
+    argumentparser = argparse.ArgumentParser(description='Parse sentences with a context free grammar.')
+    argumentparser.add_argument('sentences', nargs='*',
+                                default=testsentences,
+                                help='sentences to parse (default: two test sentences)')
+    argumentparser.add_argument('--grammar', help='grammar file, one rule per line (default: the test grammar)')
+    argumentparser.add_argument('--compiledgrammar', help='compiled grammar file, used instead of --grammar')
+    argumentparser.add_argument('--savegrammar', help='file to save the compiled grammar to')
+    argumentparser.add_argument('--lexicon', help='lexicon file, one word per line (default: the test lexicon)')
+    argumentparser.add_argument('--constituents', action='store_true', help='also print every constituent')
+    argumentparser.add_argument('--prefixes', action='store_true',
+                                help='read each sentence a word at a time, printing the categories spanning what was '
+                                     'read')
+    options = argumentparser.parse_args(arguments)
+
+    if options.compiledgrammar is not None:
+        testgrammar = CompiledGrammar.load(options.compiledgrammar)
+    elif options.grammar is None:
+        testgrammar = Grammar(grammarstring).compile()
+    else:
+        testgrammar = Grammar.from_file(options.grammar).compile()
+    # testgrammar.print()
+    # print()
+    if options.savegrammar is not None:
+        testgrammar.save(options.savegrammar)
+
+    if options.lexicon is None:
+        testlexicon = Lexicon(lexiconstring)
+    else:
+        testlexicon = Lexicon.from_file(options.lexicon)
+    # testlexicon.print()
+    # print()
+
+    for testsentence in options.sentences:
+        if options.prefixes:
+            testchart = Chart(testlexicon, testgrammar)
+            for word in testsentence.split(' '):
+                testchart.feed(word)
+                print(' '.join(testchart.words), ':',
+                      ', '.join(constituent.category for constituent in testchart.spanning()))
+        else:
+            testchart = Chart.parse(testlexicon, testgrammar, testsentence)
+        if options.constituents:
+            testchart.printconstituents()
+        testchart.printstructure()
 
-testsentence = "the old man man the boat on the water"
-testchart = Chart(testlexicon, testgrammar, testsentence)
-testchart.printconstituents()
-# print()
-testchart.printstructure()
 
-testsentence = "the old can hold water"
-testchart = Chart(testlexicon, testgrammar, testsentence)
-testchart.printstructure()
+if __name__ == '__main__':
+    main()
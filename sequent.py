@@ -1,22 +1,37 @@
 """Parser using Sequent Calculus
 
+Load a lexicon with Lexicon.from_file and parse with Chart.parse; nothing is parsed when the module is imported.
 Use chart.printstructure() for derivations. If any derivation is found, True is printed; if none, then False.
-Any boxes in the derivation correspond to multiple proofs for the same sequent."""
+Any boxes in the derivation correspond to multiple proofs for the same sequent.
+Run the module to parse the sentence list of a language (python sequent.py --help for the options)."""
 # TODO: define variables for syntactic categories, like ditransitive
 
 from collections import defaultdict
-import itertools
+import argparse
+import functools
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import pickle
+import random
+import re
+import signal
+import struct
+import threading
+import time
 
-language = 'english'
-lexiconfilename = 'lexicon/' + language + '_lexicon.txt'
-sentencefilename = 'sentences/' + language + '_sentences.txt'
+from tlg_parser import elimination
 
 
-varcounter = 0  # counter used to uniquely name syntactic variables (for abstraction)
-qrlimit = 1  # maximum number of times qr can be used in a branch of a derivation
-cooldownperiod = 2  # how many lines must be between abstraction out and in
-semvarcounter = 0  # counter to uniquely name semantic variables
-uniquedenotations = True  # remove a denotation if it is equivalent to another
+# the bundled lexicons and sentence lists are found by language, next to this file
+def lexiconpath(language):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexicon', language + '_lexicon.txt')
+
+
+def sentencepath(language):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sentences', language + '_sentences.txt')
 
 
 # a few helper functions
@@ -57,42 +72,251 @@ def cool(number):
         return 0
 
 
-def newsemanticvariable():
-    global semvarcounter
-    semvarcounter += 1
-    return semvarcounter
+# count invariant: every rule keeps the atom counts of the constituents equal to those of the goal, so a sequent whose
+# counts differ can never be proven; this holds for abstraction out and in because gaps count as nothing and
+# abstraction in is only applied when it finds the variable gap of its lambda, so the constituent it moves is never
+# dropped
+def isbalanced(constituentlist, goaltype):
+    balance = defaultdict(int)
+    for constituent in constituentlist:
+        for atom, count in constituent.syntactictype.atomcount.items():
+            balance[atom] += count
+    for atom, count in goaltype.atomcount.items():
+        balance[atom] -= count
+    return not any(balance.values())
+
+
+# returns the key under which a sequent is stored in a proof table
+# gap numbers are renumbered in order of appearance, so that sequents that only differ in the names of their gaps
+# share one key; denotations are not part of the key, since they do not change which rules apply
+def normalizesequent(constituentlist, goaltype, qrleft, cooldown):
+    gapnames = []
+    keytypes = []
+    for constituent in constituentlist:
+        syntactictype = constituent.syntactictype
+        if syntactictype.isgap:
+            if syntactictype.varname not in gapnames:
+                gapnames.append(syntactictype.varname)
+            keytypes.append(syntactictype.typestring[:-len(syntactictype.varname)] + '#' +
+                            str(gapnames.index(syntactictype.varname)))
+        else:
+            keytypes.append(syntactictype)
+    return tuple(keytypes), goaltype, qrleft, cooldown
+
+
+# the settings and counters of one parse: every chart has its own, so that charts with different settings can be
+# parsed side by side, and the numbering of its variables and gaps does not depend on what was parsed before
+# the search stops when it has proven nodebudget sequents or run for timebudget seconds (if they are set); what was
+# proven until then is kept, and truncated is set
+# the budgets are per chart: a context (and its proof table) can be shared by several charts, so each chart starts the
+# search again with startsearch, and nodecount goes on counting over all of them
+class ParseContext:
+
+    def __init__(self, qrlimit=1, cooldownperiod=2, uniquedenotations=True, nodebudget=None, timebudget=None,
+                 deepening=False, firstproof=False, maxreadings=None, focused=False, prefilter=None,
+                 engine='sequent', profile=False):
+        self.qrlimit = qrlimit  # maximum number of times qr can be used in a branch of a derivation
+        self.cooldownperiod = cooldownperiod  # how many lines must be between abstraction out and in
+        self.uniquedenotations = uniquedenotations  # remove a denotation if it is equivalent to another
+        self.nodebudget = nodebudget  # maximum number of sequents to prove (or spans to link, with proof nets)
+        self.timebudget = timebudget  # maximum number of seconds to search
+        self.deepening = deepening  # search with a qr limit of 0, then 1, up to qrlimit
+        self.firstproof = firstproof  # only find whether a sequent is valid, stopping at its first derivation
+        self.maxreadings = maxreadings  # stop once a sentence has this many readings
+        self.focused = focused  # search the qr-free parts of a proof only in normal form (see ProofNode.prove)
+        self.prefilter = prefilter  # 'rank' or 'reject' lexical assignments with an ABChart before proof search
+        # (rejecting is taken as ranking where the ABChart can miss proofs, see canreject)
+        self.engine = engine  # 'sequent' search, or 'proofnet' (the Lambek calculus only, without qr)
+        self.varcounter = 0  # counter used to uniquely name syntactic variables (for abstraction)
+        self.semvarcounter = 0  # counter to uniquely name semantic variables
+        self.nodecount = 0
+        self.searchstart = 0  # nodecount when the search of the current chart started
+        self.deadline = None
+        self.truncated = False
+        self.profile = RuleProfile() if profile else None  # counts of the rules tried, if they are kept
+
+    # starts the budgets of a chart, which run from when it starts its search; a chart that ran out of its budget
+    # leaves nothing behind for the next one, since the nodes it did not finish were taken out of the proof table
+    def startsearch(self):
+        self.searchstart = self.nodecount
+        self.truncated = False
+        if self.timebudget is not None:
+            self.deadline = time.perf_counter() + self.timebudget
+        else:
+            self.deadline = None
+
+    def withinbudget(self):
+        if self.truncated:
+            return False
+        if self.nodebudget is not None and self.nodecount - self.searchstart >= self.nodebudget or \
+                self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.truncated = True
+            return False
+        return True
+
+    def newsemanticvariable(self):
+        self.semvarcounter += 1
+        return self.semvarcounter
+
+    # a lambda gap (l) gets a new number, and a variable gap (v) takes the number of the last lambda gap
+    def newgap(self, gapstring):
+        if gapstring == 'l':
+            self.varcounter += 1
+            gaptype = 'lambda'
+        else:
+            gaptype = 'variable'
+        return SyntacticType(gapstring + str(self.varcounter), gaptype=gaptype, varname=str(self.varcounter))
+
+
+# what the proof search of a parse spent on each rule, kept when its context is made with profile=True (otherwise
+# the search only checks that there is no profile)
+# a rule is attempted each time a node tries it (a left rule once for each place its argument can end), and succeeds
+# if it proves the node; LEX is the proof of a lexical assignment, attempted once for each assignment searched
+# seconds are the time the search spent on the nodes trying a rule, not counting the nodes it asked for, which count
+# for their own rules; maxdepth is the deepest the stack of nodes being proven got, and denotations the number of
+# denotations built for nodes and for the sentence (including duplicates that were then dropped)
+# profiles of several parses are added up with add, for a report over a corpus
+class RuleProfile:
+
+    rules = ('LEX', '\\R', '/R', '\\L', '/L', 'ABS out', 'ABS in')
+
+    def __init__(self):
+        self.attempts = dict.fromkeys(self.rules, 0)
+        self.successes = dict.fromkeys(self.rules, 0)
+        self.seconds = dict.fromkeys(self.rules, 0.0)
+        self.maxdepth = 0
+        self.denotations = 0
+
+    def add(self, other):
+        for rule in self.rules:
+            self.attempts[rule] += other.attempts[rule]
+            self.successes[rule] += other.successes[rule]
+            self.seconds[rule] += other.seconds[rule]
+        self.maxdepth = max(self.maxdepth, other.maxdepth)
+        self.denotations += other.denotations
+
+    # the profile as plain data, for json or for sending between processes
+    def asdict(self):
+        return {'rules': {rule: {'attempts': self.attempts[rule], 'successes': self.successes[rule],
+                                 'failures': self.attempts[rule] - self.successes[rule],
+                                 'seconds': self.seconds[rule]} for rule in self.rules},
+                'maxdepth': self.maxdepth, 'denotations': self.denotations}
+
+    @classmethod
+    def fromdict(cls, data):
+        profile = cls()
+        for rule in cls.rules:
+            profile.attempts[rule] = data['rules'][rule]['attempts']
+            profile.successes[rule] = data['rules'][rule]['successes']
+            profile.seconds[rule] = data['rules'][rule]['seconds']
+        profile.maxdepth = data['maxdepth']
+        profile.denotations = data['denotations']
+        return profile
+
+    def print(self, title=None):
+        if title is not None:
+            print(title)
+        print('    {:8} {:>10} {:>10} {:>10} {:>10}'.format('rule', 'attempts', 'successes', 'failures', 'seconds'))
+        for rule in self.rules:
+            print('    {:8} {:10} {:10} {:10} {:10.4f}'.format(rule, self.attempts[rule], self.successes[rule],
+                                                             self.attempts[rule] - self.successes[rule],
+                                                             self.seconds[rule]))
+        print('    max depth', self.maxdepth, '  denotations built', self.denotations)
+
+
+# types are made with maketype, which parses each type string only once and builds each distinct type only once, so
+# that two types are equal exactly when they are the same object
+# the tables are shared by every parse, so new types are only added while holding typelock
+parsecache = {}  # type strings that were already parsed, and their type
+typetable = {}  # canonical string of every type that was built, and the type
+typelock = threading.RLock()
+
+
+def maketype(inputstring):
+    if inputstring in parsecache:
+        return parsecache[inputstring]
+    with typelock:
+        return buildtype(inputstring)
+
+
+def buildtype(inputstring):
+    if inputstring in parsecache:
+        return parsecache[inputstring]
+
+    typestring = stripbrackets(inputstring.replace(' ', ''))
+    if typestring == 'l' or typestring == 'v':
+        # every abstraction needs a new gap, so gaps are made by the parse context
+        raise Exception('Gaps are made with ParseContext.newgap: {}'.format(typestring))
+
+    slashindex = None
+    slashtype = None
+    # right now, assumes that everything is properly bracketed!
+    if '\\' in typestring or '/' in typestring:
+        searchindex = 0
+        while slashindex is None:
+            if typestring[searchindex] == '(':
+                searchindex = findbracketpair(typestring, searchindex) + 1
+            elif typestring[searchindex] == '\\':
+                slashindex = searchindex
+                slashtype = 'left'
+            elif typestring[searchindex] == '/':
+                slashindex = searchindex
+                slashtype = 'right'
+            else:
+                searchindex += 1
+            if searchindex >= len(typestring):
+                raise Exception("Invalid type: {}".format(typestring))
+
+    if slashtype is None:
+        syntactictype = atomtype(typestring)
+    else:
+        syntactictype = functiontype(slashtype, buildtype(typestring[:slashindex]),
+                                     buildtype(typestring[slashindex + 1:]))
+
+    parsecache[inputstring] = syntactictype
+    return syntactictype
+
+
+# the type of an atom, or of a function from its parts; these are only called while holding typelock
+def atomtype(typestring):
+    syntactictype = typetable.get(typestring)
+    if syntactictype is None:
+        syntactictype = typetable[typestring] = SyntacticType(typestring)
+    return syntactictype
+
+
+def functiontype(slashtype, left, right):
+    typestring = bracket(left) + ('\\' if slashtype == 'left' else '/') + bracket(right)
+    syntactictype = typetable.get(typestring)
+    if syntactictype is None:
+        syntactictype = typetable[typestring] = SyntacticType(typestring, slashtype, left, right)
+    return syntactictype
+
+
+def bracket(syntactictype):
+    if syntactictype.isfunction:
+        return '(' + syntactictype.typestring + ')'
+    else:
+        return syntactictype.typestring
 
 
 class SyntacticType:
 
-    def __init__(self, inputstring):
-        self.typestring = stripbrackets(inputstring.replace(' ', ''))
-        self.isfunction = '\\' in self.typestring or '/' in self.typestring
-        self.isgap = 'l' in self.typestring or 'v' in self.typestring
-        self.slashindex = None
-        self.slashtype = None
-        self.gaptype = None
-        self.varname = None
+    # use maketype rather than building types directly
+    def __init__(self, typestring, slashtype=None, left=None, right=None, gaptype=None, varname=None):
+        self.typestring = typestring
+        self.isfunction = slashtype is not None
+        self.isgap = gaptype is not None
+        self.slashtype = slashtype
+        self.gaptype = gaptype
+        self.varname = varname
+        # number of times each atom occurs, positive occurrences minus negative ones (gaps count as nothing)
+        self.atomcount = {}
+        self.ishigherorder = False  # some argument of the type is a function, as dp\s is of s/(dp\s)
 
-        # right now, assumes that everything is properly bracketed!
         if self.isfunction:
-            searchindex = 0
-            while self.slashindex is None:
-                if self.typestring[searchindex] == '(':
-                    searchindex = findbracketpair(self.typestring, searchindex) + 1
-                elif self.typestring[searchindex] == '\\':
-                    self.slashindex = searchindex
-                    self.slashtype = 'left'
-                elif self.typestring[searchindex] == '/':
-                    self.slashindex = searchindex
-                    self.slashtype = 'right'
-                else:
-                    searchindex += 1
-                if searchindex >= len(self.typestring):
-                    raise Exception("Invalid type: {}".format(self.typestring))
-
-            self.left = SyntacticType(self.typestring[:self.slashindex])
-            self.right = SyntacticType(self.typestring[self.slashindex + 1:])
+            self.left = left
+            self.right = right
 
             if self.slashtype == 'right':
                 self.top = self.left
@@ -101,15 +325,15 @@ class SyntacticType:
                 self.top = self.right
                 self.bottom = self.left
 
-        if self.isgap:
-            global varcounter
-            if 'l' in self.typestring:
-                self.gaptype = 'lambda'
-                varcounter += 1
-            else:
-                self.gaptype = 'variable'
-            self.varname = str(varcounter)
-            self.typestring += self.varname
+            self.head = self.top.head  # the atom that is left once every argument is given
+            self.ishigherorder = self.bottom.isfunction or self.top.ishigherorder
+            self.atomcount = dict(self.top.atomcount)
+            for atom, count in self.bottom.atomcount.items():
+                self.atomcount[atom] = self.atomcount.get(atom, 0) - count
+        else:
+            self.head = self
+            if not self.isgap:
+                self.atomcount = {self.typestring: 1}
 
     def print(self):
         if self.isfunction:
@@ -125,136 +349,454 @@ class SyntacticType:
     def __repr__(self):
         return self.typestring
 
+
+# denotations are lambda terms, kept in beta-eta normal form: apply, abstract and substitute reduce every redex they
+# create, so no term is ever reparsed or rewritten as a string
+# bound variables are de Bruijn indices (the number of abstractions between a variable and its abstraction), so
+# alpha-equivalent terms are equal and have the same hash; free variables are numbered with newvariable
+# every term records the hash of its structure, the number of de Bruijn indices that reach outside of it (loose) and
+# its free variables, so that equality, hashing, and skipping subterms a substitution does not touch are all cheap
+class Denotation:
+
+    def __init__(self, parts, loose, variables):
+        self.parts = parts
+        self.loose = loose
+        self.variables = variables
+        self.hash = hash((type(self).__name__,) + parts)
+
     def __eq__(self, other):
-        if not (self.isfunction and other.isfunction):
-            return self.typestring == other.typestring
-        else:
-            return self.left == other.left and self.right == other.right
+        return self is other or (type(self) is type(other) and self.hash == other.hash and self.parts == other.parts)
 
+    def __hash__(self):
+        return self.hash
 
-class Denotation:
+    def __repr__(self):
+        return self.render(0)
 
-    # if one argument, denotation is simple
-    # if two arguments, denotation is inputstring as function, and replacer as argument
-    # if three arguments, denotation is inputstring as base, with replacer replacing replacee wherever replacee occurs
-    # inputstring should be str, replacer and replacee should be denotations
-    def __init__(self, inputstring, replacer=None, replacee=None):
-        if inputstring[0] == '[' and inputstring[-1] == ']':
-            self.string = inputstring[1:-1]
-        else:
-            self.string = inputstring
-        self.denotationtype = 'simple'
-        self.simplification = None
-        self.reducedform = None
-        self.body = self.lambdavar = self.replacer = self.replacee = None
-
-        if replacer is not None:
-            # replacer is argument to function
-
-            self.body = Denotation(self.string)
-            self.replacer = replacer
-
-            if replacee is None:
-                if self.body.denotationtype == 'lambda':
-                    self.string = self.body.body.string.replace(self.body.lambdavar, str(self.replacer))
-                    self.simplification = Denotation(self.string)
-                else:
-                    self.string = str(self.body) + '(' + str(self.replacer) + ')'
+    # a term is pickled as the parts it is made from, so that its hash is made again where it is loaded
+    def __reduce__(self):
+        return type(self), self.parts
 
-            # replacee is to be replaced by replacer
-            else:
-                # replacement
 
-                self.replacee = replacee
-                if str(replacee) in self.string:
-                    self.string = self.string.replace(str(replacee), str(replacer))
-                    self.simplification = Denotation(self.string)
-                else:
-                    self.string += '[' + str(replacer) + '/' + str(replacee) + ']'
-
-        # if denotation is a lambda expression
-        elif self.string[0] == 'L':
-            self.denotationtype = 'lambda'
-            dotindex = self.string.index('.')
-            varname = self.string[1:dotindex]
-
-            # variable numbers are surrounded with < > to prevent incorrect replacement
-            # such as 'v2' being found in 'v23'
-            if varname[0] == '<' and varname[-1] == '>':
-                varindex = self.string.find(varname, dotindex)
-                # TODO: IF YOU REPLACE FIND WITH INDEX, CREATES ERROR. WHY?
-                # eta equivalence
-                if self.string[varindex - 1] == '(' and varindex + len(varname) + 1 == len(self.string):
-                    self.simplification = Denotation(self.string[dotindex+1:varindex-1])
-                else:
-                    self.lambdavar = varname
-                    self.body = Denotation(self.string[dotindex + 1:])
-            else:
-                self.lambdavar = '<' + str(newsemanticvariable()) + '>'
-                self.body = Denotation(self.string[dotindex + 1:].replace(varname, self.lambdavar))
-                self.string = 'L' + self.lambdavar + '.' + str(self.body)
+class Constant(Denotation):
 
-        # if denotation is a semantic variable, assign it a unique number
-        elif self.string == 'var':
-            self.denotationtype = 'variable'
+    def __init__(self, name):
+        super().__init__((name,), 0, frozenset())
+        self.name = name
 
-            self.body = None
-            self.string = '<' + str(newsemanticvariable()) + '>'
+    def render(self, depth):
+        return self.name
 
-        if self.simplification is not None:
-            if self.simplification.reducedform is None:
-                self.reducedform = self.simplification
-            else:
-                self.reducedform = self.simplification.reducedform
 
-    def __repr__(self):
-        if self.reducedform is not None:
-            return str(self.reducedform)
+# a free variable, standing for a hypothesis of the proof
+class Variable(Denotation):
+
+    def __init__(self, number):
+        super().__init__((number,), 0, frozenset([number]))
+        self.number = number
+
+    def render(self, depth):
+        return '?' + str(self.number)
+
+
+class BoundVariable(Denotation):
+
+    def __init__(self, index):
+        super().__init__((index,), index + 1, frozenset())
+        self.index = index
+
+    # bound variables are named after the depth of their abstraction
+    def render(self, depth):
+        return '<' + str(depth - self.index) + '>'
+
+
+class Abstraction(Denotation):
+
+    def __init__(self, body):
+        super().__init__((body,), max(body.loose - 1, 0), body.variables)
+        self.body = body
+
+    def render(self, depth):
+        return 'L<' + str(depth + 1) + '>.' + self.body.render(depth + 1)
+
+
+class Application(Denotation):
+
+    def __init__(self, function, argument):
+        super().__init__((function, argument), max(function.loose, argument.loose),
+                         function.variables | argument.variables)
+        self.function = function
+        self.argument = argument
+
+    def render(self, depth):
+        return self.function.render(depth) + '(' + self.argument.render(depth) + ')'
+
+
+# notation that is not lambda calculus, such as ~P or [Ax.person(x)>P(x)], as a tuple of strings and terms
+class Text(Denotation):
+
+    def __init__(self, parts):
+        terms = [part for part in parts if isinstance(part, Denotation)]
+        super().__init__(parts, max([term.loose for term in terms], default=0),
+                         frozenset().union(*[term.variables for term in terms]))
+
+    def __reduce__(self):
+        return Text, (self.parts,)
+
+    def render(self, depth):
+        return ''.join(part if isinstance(part, str) else part.render(depth) for part in self.parts)
+
+
+def newvariable(context):
+    return Variable(context.newsemanticvariable())
+
+
+def apply(function, argument):
+    if isinstance(function, Abstraction):
+        return instantiate(function.body, argument)
+    elif isinstance(function, Text) and function.parts and isinstance(function.parts[-1], Denotation):
+        # text reads as it is written: ~P applied to x is ~P(x)
+        return Text(function.parts[:-1] + (apply(function.parts[-1], argument),))
+    else:
+        return Application(function, argument)
+
+
+# abstracts over every occurrence of a free variable
+def abstract(denotation, variable):
+    def bind(leaf, depth):
+        return BoundVariable(depth) if leaf == variable else leaf
+
+    return makeabstraction(transform(denotation, 0, bind, lambda subterm, depth: variable.number not in
+                                     subterm.variables))
+
+
+# replaces every occurrence of a free variable with value
+def substitute(denotation, variable, value):
+    def replace(leaf, depth):
+        return shift(value, depth) if leaf == variable else leaf
+
+    return transform(denotation, 0, replace, lambda subterm, depth: variable.number not in subterm.variables)
+
+
+# replaces de Bruijn index 0 with value, in the body of an abstraction that is being applied to value
+def instantiate(body, value, depth=0):
+    def replace(leaf, leafdepth):
+        if isinstance(leaf, BoundVariable) and leaf.index == leafdepth:
+            return shift(value, leafdepth)
+        elif isinstance(leaf, BoundVariable) and leaf.index > leafdepth:
+            return BoundVariable(leaf.index - 1)
         else:
-            return self.string
+            return leaf
 
-    def __eq__(self, other):
-        if self.string == other.string:
-            return True
-        elif '<' in self.string:
-            selfreducedstring = reducestring(self.string)
-            otherreducedstring = reducestring(other.string)
-            return selfreducedstring == otherreducedstring
+    return transform(body, depth, replace, lambda subterm, subdepth: subterm.loose <= subdepth)
+
+
+# adds amount to every de Bruijn index that reaches outside of denotation
+def shift(denotation, amount):
+    def move(leaf, depth):
+        if isinstance(leaf, BoundVariable) and leaf.index >= depth:
+            return BoundVariable(leaf.index + amount)
         else:
-            return False
+            return leaf
+
+    if amount == 0:
+        return denotation
+    return transform(denotation, 0, move, lambda subterm, depth: subterm.loose <= depth)
+
+
+# rebuilds a term with every variable replaced by leaf(variable, depth), depth being the number of abstractions
+# around it; subterms for which unchanged(subterm, depth) holds are kept as they are
+# rebuilding goes through apply and makeabstraction, so redexes created by the replacement are reduced straight away
+def transform(denotation, depth, leaf, unchanged):
+    if unchanged(denotation, depth):
+        return denotation
+    elif isinstance(denotation, Application):
+        return apply(transform(denotation.function, depth, leaf, unchanged),
+                     transform(denotation.argument, depth, leaf, unchanged))
+    elif isinstance(denotation, Abstraction):
+        return makeabstraction(transform(denotation.body, depth + 1, leaf, unchanged))
+    elif isinstance(denotation, Text):
+        return Text(tuple(part if isinstance(part, str) else transform(part, depth, leaf, unchanged)
+                          for part in denotation.parts))
+    else:
+        return leaf(denotation, depth)
+
+
+# eta equivalence: Lx.f(x) is f, as long as x does not occur in f (and likewise Lx.~P(x) is ~P)
+def makeabstraction(body):
+    if isinstance(body, Application) and body.argument == BoundVariable(0) and not occurs(body.function, 0):
+        return shift(body.function, -1)
+    elif isinstance(body, Text) and body.parts and isinstance(body.parts[-1], Application):
+        function = Text(body.parts[:-1] + (body.parts[-1].function,))
+        if body.parts[-1].argument == BoundVariable(0) and not occurs(function, 0):
+            return shift(function, -1)
+    return Abstraction(body)
+
+
+def occurs(denotation, index):
+    if denotation.loose <= index:
+        return False
+    elif isinstance(denotation, BoundVariable):
+        return denotation.index == index
+    elif isinstance(denotation, Abstraction):
+        return occurs(denotation.body, index + 1)
+    elif isinstance(denotation, Application):
+        return occurs(denotation.function, index) or occurs(denotation.argument, index)
+    else:
+        return any(occurs(part, index) for part in denotation.parts if isinstance(part, Denotation))
+
+
+# parses the denotation of a lexical entry, such as see, LP.~P or LP.Lx.someone(P(x))
+# Lx. starts an abstraction that reaches to the end of the enclosing brackets; f(a) is an application, and f(a,b) an
+# application to the text a,b; every other character is kept as text
+def parsedenotation(inputstring):
+    if inputstring[0] == '[' and inputstring[-1] == ']':
+        inputstring = inputstring[1:-1]
+    tokens = re.findall(r"[A-Za-z0-9_']+|.", inputstring)
+    denotation, position = parseterm(tokens, 0, [])
+    if position < len(tokens):
+        raise Exception('Invalid denotation: {}'.format(inputstring))
+    return denotation
+
+
+# names are the variables bound around the term, innermost last
+def parseterm(tokens, position, names):
+    parts = []
+    while position < len(tokens) and tokens[position] not in (')', ']', ','):
+        if tokens[position][0] == 'L' and len(tokens[position]) > 1 and tokens[position + 1:position + 2] == ['.']:
+            body, position = parseterm(tokens, position + 2, names + [tokens[position][1:]])
+            parts.append(makeabstraction(body))
+        else:
+            part, position = parseitem(tokens, position, names)
+            parts.append(part)
+    if len(parts) == 1 and isinstance(parts[0], Denotation):
+        return parts[0], position
+    else:
+        return Text(tuple(parts)), position
+
+
+def parseitem(tokens, position, names):
+    token = tokens[position]
+    if token == '(' or token == '[':
+        inner, position = parseterm(tokens, position + 1, names)
+        closing = ')' if token == '(' else ']'
+        if position >= len(tokens) or tokens[position] != closing:
+            raise Exception('Unbalanced brackets in denotation: {}'.format(''.join(tokens)))
+        item = Text((token, inner, closing))
+    elif re.match(r"[A-Za-z0-9_']", token):
+        if token in names:
+            item = BoundVariable(names[::-1].index(token))
+        else:
+            item = Constant(token)
+    else:
+        return token, position + 1
+    position += 1
+
+    while position < len(tokens) and tokens[position] == '(':
+        arguments = []
+        argument, position = parseterm(tokens, position + 1, names)
+        arguments.append(argument)
+        while position < len(tokens) and tokens[position] == ',':
+            argument, position = parseterm(tokens, position + 1, names)
+            arguments += [',', argument]
+        if position >= len(tokens) or tokens[position] != ')':
+            raise Exception('Unbalanced brackets in denotation: {}'.format(''.join(tokens)))
+        position += 1
+        if len(arguments) == 1:
+            item = apply(item, arguments[0])
+        else:
+            item = Application(item, Text(tuple(arguments)))
+    return item, position
 
 
-def reducestring(string):
-    reducedstring = string
-    reducedvarcounter = 0
-    while '<' in reducedstring:
-        leftindex = reducedstring.find('<')
-        rightindex = reducedstring.find('>', leftindex)
-        varnumber = reducedstring[leftindex + 1:rightindex]
-        reducedstring = reducedstring.replace('<' + varnumber + '>', '{' + str(reducedvarcounter) + '}')
-        reducedvarcounter += 1
-    return reducedstring
+# the cache of a lexicon file starts with a header: a marker, the version of the format, the sha256 hash of the lexicon
+# file it was made from, and the length of its directory; the directory is a pickle of the types of the lexicon (each
+# an atom, or a slash and the numbers of its two parts, which come before it) and of where the entries of each word
+# are; after it, the entries of each word are a pickle of the number of the type and the denotation of each entry
+cachemarker = b'SQLX'
+cacheversion = 1
+cacheheader = struct.Struct('<4sI32sQ')
 
 
 # define lexicon as a string, one entry per line. entries are of the form:
 # word : type - denotation
+# once it is read, the words of a lexicon are fixed: looking up a word that is not in it adds nothing
+# a lexicon loaded from a cache only makes the entries of a word when it is first looked up with getentries
+# backoff is a list of type strings given to every word that is not in the lexicon, with the word as its denotation;
+# they are made for each such word when it is first looked up, and kept apart from the words of the lexicon
 class Lexicon:
 
-    def __init__(self, lexiconstring):
-        self.entrytypes = defaultdict(list)
-        self.denotations = defaultdict(list)
+    def __init__(self, lexiconstring='', backoff=None):
+        entrytypes = defaultdict(list)
+        denotations = defaultdict(list)
+        self.cacheindex = None  # for each word in the cache, where its entries are
+        self.cachetypes = None  # the types of the cache, and the types made from them so far
+        self.cachedata = None
+        if backoff is None:
+            self.backoff = []
+        else:
+            self.backoff = [maketype(typestring) for typestring in backoff]
+        self.backoffentries = {}
         for entryline in lexiconstring.split('\n'):
             entry = entryline.replace(' ', '')
-            if entry is not '' and entry[0] is not '#':
+            if entry != '' and entry[0] != '#':
                 colonindex = entry.index(':')
                 dashindex = entry.index('-')
                 entryname = entry[:colonindex].strip()
-                self.entrytypes[entryname].append(SyntacticType(entry[colonindex + 1: dashindex].strip()))
-                self.denotations[entryname].append(entry[dashindex + 1:].strip())
+                entrytypes[entryname].append(maketype(entry[colonindex + 1: dashindex].strip()))
+                denotations[entryname].append(parsedenotation(entry[dashindex + 1:].strip()))
+        self.entrytypes = dict(entrytypes)
+        self.denotations = dict(denotations)
+
+    @classmethod
+    def from_file(cls, filename, backoff=None):
+        with open(filename, 'r', encoding='utf-8') as lexiconfile:
+            return cls(lexiconfile.read(), backoff)
+
+    # loads a lexicon file through its cache (by default the file name with .cache added), which is written first if
+    # it is missing, of another version, or made from a different lexicon file
+    # if the cache cannot be written or read back (say the directory is read only), the lexicon just parsed is used
+    @classmethod
+    def from_cache(cls, filename, cachefilename=None, backoff=None):
+        if cachefilename is None:
+            cachefilename = filename + '.cache'
+        with open(filename, 'rb') as lexiconfile:
+            source = lexiconfile.read()
+        sourcehash = hashlib.sha256(source).digest()
+        lexicon = cls.loadcache(cachefilename, sourcehash, backoff)
+        if lexicon is None:
+            parsed = cls(source.decode('utf-8'), backoff)
+            try:
+                parsed.writecache(cachefilename, sourcehash)
+            except OSError:
+                return parsed
+            lexicon = cls.loadcache(cachefilename, sourcehash, backoff)
+            if lexicon is None:
+                return parsed
+        return lexicon
+
+    # writes the cache of a lexicon file, and returns the name of the cache
+    @classmethod
+    def compile(cls, filename, cachefilename=None):
+        if cachefilename is None:
+            cachefilename = filename + '.cache'
+        with open(filename, 'rb') as lexiconfile:
+            source = lexiconfile.read()
+        cls(source.decode('utf-8')).writecache(cachefilename, hashlib.sha256(source).digest())
+        return cachefilename
+
+    def writecache(self, cachefilename, sourcehash):
+        typenumbers = {}
+        types = []
+
+        def numbertype(syntactictype):
+            if syntactictype not in typenumbers:
+                if syntactictype.isfunction:
+                    types.append((syntactictype.slashtype, numbertype(syntactictype.left),
+                                  numbertype(syntactictype.right)))
+                else:
+                    types.append(syntactictype.typestring)
+                typenumbers[syntactictype] = len(types) - 1
+            return typenumbers[syntactictype]
+
+        index = {}
+        entrydata = []
+        offset = 0
+        for word in self.entrytypes:
+            entries = pickle.dumps([(numbertype(syntactictype), denotation) for syntactictype, denotation in
+                                    zip(self.entrytypes[word], self.denotations[word])], pickle.HIGHEST_PROTOCOL)
+            index[word] = (offset, len(entries))
+            entrydata.append(entries)
+            offset += len(entries)
+        directory = pickle.dumps((types, index), pickle.HIGHEST_PROTOCOL)
+
+        # the cache is written to another file first, so that a cache being written is never read
+        # (and removed if writing fails)
+        temporaryfilename = '{}.{}.tmp'.format(cachefilename, os.getpid())
+        try:
+            with open(temporaryfilename, 'wb') as cachefile:
+                cachefile.write(cacheheader.pack(cachemarker, cacheversion, sourcehash, len(directory)))
+                cachefile.write(directory)
+                for entries in entrydata:
+                    cachefile.write(entries)
+            os.replace(temporaryfilename, cachefilename)
+        except OSError:
+            if os.path.exists(temporaryfilename):
+                os.remove(temporaryfilename)
+            raise
+
+    # a lexicon reading the cache through a memory map, or None if there is no cache for the lexicon file
+    @classmethod
+    def loadcache(cls, cachefilename, sourcehash, backoff=None):
+        try:
+            with open(cachefilename, 'rb') as cachefile:
+                cachedata = mmap.mmap(cachefile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        if len(cachedata) < cacheheader.size:
+            return None
+        marker, version, cachehash, directorylength = cacheheader.unpack_from(cachedata)
+        if marker != cachemarker or version != cacheversion or cachehash != sourcehash:
+            return None
+        lexicon = cls('', backoff)
+        lexicon.cachetypes, lexicon.cacheindex = pickle.loads(cachedata[cacheheader.size:
+                                                                        cacheheader.size + directorylength])
+        lexicon.cachedata = memoryview(cachedata)[cacheheader.size + directorylength:]
+        return lexicon
+
+    def haswordentries(self, word):
+        if self.cacheindex is None:
+            return word in self.entrytypes
+        return word in self.cacheindex
+
+    # the words of a sentence that are not in the lexicon, found without making any entries
+    def unknownwords(self, words):
+        return [word for word in words if not self.haswordentries(word)]
+
+    # the types and denotations of the entries of a word; a word that is not in the lexicon has the backoff entries,
+    # or none
+    def getentries(self, word):
+        if word in self.entrytypes:
+            return self.entrytypes[word], self.denotations[word]
+        if self.cacheindex is not None and word in self.cacheindex:
+            self.readentries(word)
+            return self.entrytypes[word], self.denotations[word]
+        if len(self.backoff) == 0:
+            return [], []
+        entries = self.backoffentries.get(word)
+        if entries is None:
+            entries = self.backoffentries[word] = (self.backoff, [Constant(word)] * len(self.backoff))
+        return entries
+
+    def readentries(self, word):
+        offset, length = self.cacheindex[word]
+        entries = pickle.loads(self.cachedata[offset:offset + length])
+        with typelock:
+            entrytypes = [self.cachetype(number) for number, denotation in entries]
+        self.denotations[word] = [denotation for number, denotation in entries]
+        self.entrytypes[word] = entrytypes
+
+    # the type with a number in the cache, made the first time it is needed
+    def cachetype(self, number):
+        syntactictype = self.cachetypes[number]
+        if isinstance(syntactictype, str):
+            syntactictype = self.cachetypes[number] = atomtype(syntactictype)
+        elif isinstance(syntactictype, tuple):
+            slashtype, left, right = syntactictype
+            syntactictype = self.cachetypes[number] = functiontype(slashtype, self.cachetype(left),
+                                                                   self.cachetype(right))
+        return syntactictype
+
+    # every word of the lexicon, including those in the cache that were not looked up
+    def words(self):
+        if self.cacheindex is None:
+            return list(self.entrytypes)
+        return list(self.cacheindex)
 
     def print(self):
-        for entry in self.entrytypes:
-            print(entry, ':', self.entrytypes[entry], '-', self.denotations[entry])
+        for entry in self.words():
+            entrytypes, denotations = self.getentries(entry)
+            print(entry, ':', entrytypes, '-', denotations)
 
 
 class Constituent:
@@ -270,25 +812,94 @@ class Constituent:
         return repr(self.syntactictype)
 
 
-# a list of constituents and the goal type
-class Sequence:
+# replaces each variable with the matching value
+def substituteall(denotation, variables, values):
+    for variable, value in zip(variables, values):
+        denotation = substitute(denotation, variable, value)
+    return denotation
 
-    def __init__(self, constituentlist, goaltype, rule, qrcount=0, cooldown=0):
-        self.constituents = constituentlist
+
+# removes denotations equivalent to one that came before, if uniquedenotations is set in the parse context
+# denotations are hashed by their structure, so equivalent ones are found in a set without comparing against every
+# stored denotation; the list keeps them in the order they were found
+def adddenotation(denotations, denotationset, denotation, context):
+    if context.profile is not None:
+        context.profile.denotations += 1
+    if context.uniquedenotations:
+        if denotation not in denotationset:
+            denotationset.add(denotation)
+            denotations.append(denotation)
+    else:
+        denotations.append(denotation)
+
+
+# the proof table is a packed forest: every distinct sequent is a node that is proven once, and stores each rule that
+# proves it as a RuleApplication pointing to the nodes of its premises
+# a node is proven with a new variable standing in for the denotation of each of its constituents, so that one node
+# serves every sequence with the same key; its readings are only made when they are asked for
+# a node can use qr until qrcount reaches qrlimit; nodes with as many uses left are the same, whatever the limit
+class ProofNode:
+
+    def __init__(self, constituentlist, goaltype, qrcount, cooldown, prooftable, qrlimit=None):
+        self.variables = [newvariable(prooftable.context) for constituent in constituentlist]
+        self.constituents = [Constituent(constituent.syntactictype, variable)
+                             for constituent, variable in zip(constituentlist, self.variables)]
         self.goal = goaltype
-        self.subtrees = []
-        self.isvalid = False
-        self.denotations = []
-        self.ruleused = rule
         self.qrcount = qrcount
+        if qrlimit is None:
+            self.qrlimit = prooftable.context.qrlimit
+        else:
+            self.qrlimit = qrlimit
         self.cooldown = cooldown
-        # print(self.constituents)
-
+        self.hasgaps = any(constituent.syntactictype.isgap for constituent in constituentlist)
+        self.prooftable = prooftable
+        self.isvalid = False
+        self.isaxiom = False
+        self.applications = []
+        self.denotations = None
+        self.derivationcount = None
+        self.rule = None  # the rule being tried, for a profile
+
+    # proves a premise through the proof table; the denotations of its constituents are kept to relate its variables
+    # to the variables of this node
+    # prove and premise are generators: a premise is asked of the proof table by yielding it, and the table sends back
+    # its node once it is proven, so that the search needs no recursion (see ProofTable.search)
+    # the first premise of an attempt at a rule is asked for with the rule
+    def premise(self, constituentlist, goaltype, qrcount, cooldown, rule=None):
+        if rule is not None:
+            self.rule = rule
+            profile = self.prooftable.context.profile
+            if profile is not None:
+                profile.attempts[rule] += 1
+        node = yield constituentlist, goaltype, qrcount, cooldown, self.qrlimit
+        return Premise(node, [constituent.denotation for constituent in constituentlist])
+
+    # whether the left rules of a constituent are searched (see prove)
+    def isfocusable(self, position):
+        if not self.prooftable.context.focused or self.hasgaps or self.qrcount < self.qrlimit:
+            return True
+        if self.goal.isfunction:
+            return False
+        return self.constituents[position].syntactictype.head is self.goal
+
+    def addapplication(self, application):
+        self.applications.append(application)
+        self.isvalid = True
+        profile = self.prooftable.context.profile
+        if profile is not None:
+            profile.successes[application.rule] += 1
+
+    # a focused search leaves out proofs that only differ from another in the order of their rules, and so have the same
+    # reading: once qr is used up and no gaps are left, a sequent is proven as in the focused Lambek calculus, a
+    # function goal only by its right rule and an atomic goal only by left rules of constituents with the goal as their
+    # head; qr and abstraction in do not commute with the other rules (a rule after qr can count towards its cooldown),
+    # so sequents with qr left or with gaps are searched in full; the sequents themselves are those of the full search
+    def prove(self):
         # check axiom
         if len(self.constituents) == 1 and self.constituents[0].syntactictype == self.goal and not self.goal.isfunction:
             # apply axiom
             self.isvalid = True
-            self.adddenotation(self.constituents[0].denotation)
+            self.isaxiom = True
         elif len(self.constituents) == 0:
             self.isvalid = False
         else:
@@ -296,69 +907,59 @@ class Sequence:
             # check right rules
             if self.goal.isfunction:
                 # apply right rules
-                newdenotation = Denotation('var')
+                newdenotation = newvariable(self.prooftable.context)
                 if self.goal.slashtype == 'left':
                     # apply right backslash
-                    subsequence = Sequence([Constituent(self.goal.left, newdenotation)] + self.constituents,
-                                           self.goal.right, '\\R', self.qrcount, cool(self.cooldown))
+                    rule = '\\R'
+                    premise = yield from self.premise([Constituent(self.goal.left, newdenotation)] + self.constituents,
+                                                      self.goal.right, self.qrcount, cool(self.cooldown), rule=rule)
                 else:
                     # apply right slash
-                    subsequence = Sequence(self.constituents + [Constituent(self.goal.right, newdenotation)],
-                                           self.goal.left, '/R', self.qrcount, cool(self.cooldown))
-                if subsequence.isvalid:
-                    self.subtrees.append([subsequence])
-                    self.isvalid = True
-                    for denotation in subsequence.denotations:
-                        self.adddenotation(Denotation('L' + str(newdenotation) + '.' + str(denotation)))
+                    rule = '/R'
+                    premise = yield from self.premise(self.constituents + [Constituent(self.goal.right, newdenotation)],
+                                                      self.goal.left, self.qrcount, cool(self.cooldown), rule=rule)
+                if premise.node.isvalid:
+                    self.addapplication(RuleApplication(rule, [premise], newdenotation))
 
             # check left rules
             for counter in range(len(self.constituents)):
                 constituent = self.constituents[counter]
+                if not self.isfocusable(counter):
+                    continue
                 if constituent.syntactictype.isfunction:
                     if constituent.syntactictype.slashtype == 'left':
                         # apply left backslash
                         for i in range(counter - 1, -1, -1):
-                            subsequence1 = Sequence(self.constituents[i:counter], constituent.syntactictype.left, '\\L',
-                                                    self.qrcount, cool(self.cooldown))
-                            if subsequence1.isvalid:
-                                newdenotation = Denotation('var')
-                                subsequence2 = Sequence(self.constituents[0:i] +
-                                                        [Constituent(constituent.syntactictype.right, newdenotation)] +
-                                                        self.constituents[counter + 1:], self.goal, '\\L', self.qrcount,
-                                                        cool(self.cooldown))
-                                if subsequence2.isvalid:
-                                    self.subtrees.append([subsequence1, subsequence2])
-                                    self.isvalid = True
-                                    for denotation2 in subsequence2.denotations:
-                                        for denotation1 in subsequence1.denotations:
-                                            self.adddenotation(
-                                                Denotation(str(denotation2),
-                                                           Denotation(str(constituent.denotation), denotation1),
-                                                           newdenotation))
+                            premise1 = yield from self.premise(self.constituents[i:counter],
+                                                               constituent.syntactictype.left, self.qrcount,
+                                                               cool(self.cooldown), rule='\\L')
+                            if premise1.node.isvalid:
+                                newdenotation = newvariable(self.prooftable.context)
+                                result = Constituent(constituent.syntactictype.right, newdenotation)
+                                constituentlist = self.constituents[0:i] + [result] + self.constituents[counter + 1:]
+                                premise2 = yield from self.premise(constituentlist, self.goal, self.qrcount,
+                                                                   cool(self.cooldown))
+                                if premise2.node.isvalid:
+                                    self.addapplication(RuleApplication('\\L', [premise1, premise2], newdenotation,
+                                                                        constituent.denotation))
                     else:
                         # apply left slash
                         for i in range(counter + 1, len(self.constituents), 1):
-                            subsequence1 = Sequence(self.constituents[counter + 1:i + 1],
-                                                    constituent.syntactictype.right, '/L', self.qrcount,
-                                                    cool(self.cooldown))
-                            if subsequence1.isvalid:
-                                newdenotation = Denotation('var')
-                                subsequence2 = Sequence(self.constituents[:counter] +
-                                                        [Constituent(constituent.syntactictype.left, newdenotation)] +
-                                                        self.constituents[i + 1:], self.goal, '/L', self.qrcount,
-                                                        cool(self.cooldown))
-                                if subsequence2.isvalid:
-                                    self.subtrees.append([subsequence1, subsequence2])
-                                    self.isvalid = True
-                                    for denotation2 in subsequence2.denotations:
-                                        for denotation1 in subsequence1.denotations:
-                                            self.adddenotation(
-                                                Denotation(str(denotation2),
-                                                           Denotation(str(constituent.denotation), denotation1),
-                                                           newdenotation))
+                            premise1 = yield from self.premise(self.constituents[counter + 1:i + 1],
+                                                               constituent.syntactictype.right, self.qrcount,
+                                                               cool(self.cooldown), rule='/L')
+                            if premise1.node.isvalid:
+                                newdenotation = newvariable(self.prooftable.context)
+                                result = Constituent(constituent.syntactictype.left, newdenotation)
+                                constituentlist = self.constituents[:counter] + [result] + self.constituents[i + 1:]
+                                premise2 = yield from self.premise(constituentlist, self.goal, self.qrcount,
+                                                                   cool(self.cooldown))
+                                if premise2.node.isvalid:
+                                    self.addapplication(RuleApplication('/L', [premise1, premise2], newdenotation,
+                                                                        constituent.denotation))
 
             # check qr rules
-            if self.qrcount < qrlimit:
+            if self.qrcount < self.qrlimit:
                 for counter in range(len(self.constituents)):
                     # only try QR on functions
                     constituent = self.constituents[counter]
@@ -367,20 +968,18 @@ class Sequence:
                     else:
                         nextconstituent = constituent
                     if constituent.syntactictype.isfunction and \
-                            nextconstituent.syntactictype.gaptype is not 'lambda':
+                            nextconstituent.syntactictype.gaptype != 'lambda':
                         # and constituent.syntactictype.bottom.isfunction ---add this for quantifier types
                         # ensure that you don't abstract a term twice in a row (may cause problems??)
                         # checks whether the next constituent is a lambda (which would indicate abstraction already)
-                        subsequence = Sequence([constituent, Constituent(SyntacticType('l'), Denotation('l'))] +
-                                               self.constituents[:counter] +
-                                               [Constituent(SyntacticType('v'), Denotation('v'))] +
-                                               self.constituents[counter + 1:], self.goal, 'ABS out',
-                                               self.qrcount + 1, cooldownperiod)
-                        if subsequence.isvalid:
-                            self.subtrees.append([subsequence])
-                            self.isvalid = True
-                            for denotation in subsequence.denotations:
-                                self.adddenotation(denotation)
+                        context = self.prooftable.context
+                        constituentlist = [constituent, Constituent(context.newgap('l'), Constant('l'))] + \
+                            self.constituents[:counter] + [Constituent(context.newgap('v'), Constant('v'))] + \
+                            self.constituents[counter + 1:]
+                        premise = yield from self.premise(constituentlist, self.goal, self.qrcount + 1,
+                                                          context.cooldownperiod, rule='ABS out')
+                        if premise.node.isvalid:
+                            self.addapplication(RuleApplication('ABS out', [premise]))
 
             if self.cooldown == 0 and len(self.constituents) > 2:
                 for counter in range(len(self.constituents)):
@@ -393,27 +992,267 @@ class Sequence:
                         # perhaps not needed if only using top-level abstraction
                         # print('full: ', self.constituents)
                         # print('selection: ', self.constituents[:counter - 1] + self.constituents[counter + 1:])
-                        subsequence = Sequence([self.constituents[counter - 1]
-                                                if constituent.syntactictype.typestring == 'v' + lambdaname
-                                                else constituent for constituent in self.constituents[:counter - 1] +
-                                                self.constituents[counter + 1:]],
-                                               self.goal, 'ABS in', self.qrcount, 0)
-                        if subsequence.isvalid:
-                            self.subtrees.append([subsequence])
-                            self.isvalid = True
-                            for denotation in subsequence.denotations:
-                                self.adddenotation(denotation)
-
-    def adddenotation(self, denotation):
-        if uniquedenotations:
-            denotationexist = False
-            for denotationtocheck in self.denotations:
-                if denotationtocheck == denotation:
-                    denotationexist = True
-            if not denotationexist:
-                self.denotations.append(denotation)
+                        # abstraction in needs the variable gap of its lambda, so that the constituent it puts in
+                        # place of the variable is never dropped (see isbalanced)
+                        remaining = self.constituents[:counter - 1] + self.constituents[counter + 1:]
+                        if not any(constituent.syntactictype.typestring == 'v' + lambdaname
+                                   for constituent in remaining):
+                            continue
+                        constituentlist = [self.constituents[counter - 1]
+                                           if constituent.syntactictype.typestring == 'v' + lambdaname
+                                           else constituent for constituent in remaining]
+                        premise = yield from self.premise(constituentlist, self.goal, self.qrcount, 0, rule='ABS in')
+                        if premise.node.isvalid:
+                            self.addapplication(RuleApplication('ABS in', [premise]))
+
+    # the readings of the sequent in terms of its variables, made on first use and kept
+    def getdenotations(self):
+        if self.denotations is None:
+            self.denotations = []
+            denotationset = set()
+            if self.isaxiom:
+                adddenotation(self.denotations, denotationset, self.variables[0], self.prooftable.context)
+            for application in self.applications:
+                for denotation in application.denotations(Premise.getdenotations):
+                    adddenotation(self.denotations, denotationset, denotation, self.prooftable.context)
+        return self.denotations
+
+    # the reading of every derivation in turn, made only as it is reached (so duplicates are included)
+    def iterdenotations(self):
+        if self.isaxiom:
+            yield self.variables[0]
+        for application in self.applications:
+            yield from application.denotations(Premise.iterdenotations)
+
+    # the number of derivations of the sequent, without building them
+    def countderivations(self):
+        if self.derivationcount is None:
+            self.derivationcount = 1 if self.isaxiom else 0
+            for application in self.applications:
+                count = 1
+                for premise in application.premises:
+                    count *= premise.node.countderivations()
+                self.derivationcount += count
+        return self.derivationcount
+
+
+# a premise of a rule application: the node that proves it, and the denotations of its constituents in terms of the
+# variables of the node the rule was applied to
+class Premise:
+
+    def __init__(self, node, denotations):
+        self.node = node
+        self.denotations = denotations
+        self.denotationlist = None
+
+    def getdenotations(self):
+        if self.denotationlist is None:
+            self.denotationlist = [substituteall(denotation, self.node.variables, self.denotations)
+                                   for denotation in self.node.getdenotations()]
+        return self.denotationlist
+
+    def iterdenotations(self):
+        for denotation in self.node.iterdenotations():
+            yield substituteall(denotation, self.node.variables, self.denotations)
+
+
+# one rule proving a sequent: the rule, its premises, the variable it introduces for a hypothesis or for the result
+# of a function (right and left rules), and the denotation of that function (left rules)
+class RuleApplication:
+
+    def __init__(self, rule, premises, variable=None, functor=None):
+        self.rule = rule
+        self.premises = premises
+        self.variable = variable
+        self.functor = functor
+
+    # the readings this rule gives, from the readings of its premises (as given by premisedenotations)
+    def denotations(self, premisedenotations):
+        if self.rule == '\\R' or self.rule == '/R':
+            for denotation in premisedenotations(self.premises[0]):
+                yield abstract(denotation, self.variable)
+        elif self.rule == '\\L' or self.rule == '/L':
+            for denotation2 in premisedenotations(self.premises[1]):
+                for denotation1 in premisedenotations(self.premises[0]):
+                    yield substitute(denotation2, self.variable, apply(self.functor, denotation1))
         else:
-            self.denotations.append(denotation)
+            yield from premisedenotations(self.premises[0])
+
+
+# memo table of proven sequents, keyed by the normalized sequent (see normalizesequent)
+# a chart shares one table between all of its sequences; pass the same table to several charts to share it further
+# the nodes of a table are proven with the settings of its parse context, so a table is only shared by parses with the
+# same context
+class ProofTable:
+
+    def __init__(self, context=None):
+        if context is None:
+            self.context = ParseContext()
+        else:
+            self.context = context
+        self.nodes = {}
+        # a sequent that fails the count invariant cannot be valid, so it needs no search, nor a node of its own
+        self.unbalanced = ProofNode([], None, 0, 0, self)
+        self.hits = 0
+        self.misses = 0
+
+    # returns the node for a sequent, proving it first if it is new
+    def node(self, constituentlist, goaltype, qrcount, cooldown, qrlimit=None, enough=None):
+        if qrlimit is None:
+            qrlimit = self.context.qrlimit
+        node, isnew = self.findnode(constituentlist, goaltype, qrcount, cooldown, qrlimit)
+        if isnew:
+            self.search(node, enough)
+        return node
+
+    # the node for a sequent, and whether it is new (and so still has to be proven)
+    def findnode(self, constituentlist, goaltype, qrcount, cooldown, qrlimit):
+        if not isbalanced(constituentlist, goaltype):
+            return self.unbalanced, False
+        key = normalizesequent(constituentlist, goaltype, qrlimit - qrcount, cooldown)
+        node = self.nodes.get(key)
+        if node is not None:
+            self.hits += 1
+            return node, False
+        self.misses += 1
+        self.context.nodecount += 1
+        node = self.nodes[key] = ProofNode(constituentlist, goaltype, qrcount, cooldown, self, qrlimit)
+        return node, True
+
+    # proves a node and every new node it needs, depth first with a stack of the nodes being proven; each is proven by
+    # its prove generator, which yields the premises it needs and is sent their nodes
+    # if the budget of the parse context runs out, the nodes on the stack are left with the rules found so far, which
+    # are all sound, and are taken out of the table so that they are not taken for complete
+    # with firstproof, a node is finished as soon as it is valid; enough is asked about the root each time it gets a
+    # new rule, and the search stops when it says so, as if the budget had run out
+    def search(self, root, enough=None):
+        stack = [(root, root.prove())]
+        node = None
+        checked = 0
+        # with a profile, the time of each step counts for the rule the node being proven is trying; a new node is
+        # trying the rule that asked for it until it tries one of its own
+        profile = self.context.profile
+        if profile is not None:
+            root.rule = 'LEX'
+            profile.maxdepth = max(profile.maxdepth, 1)
+            steptime = time.perf_counter()
+        while len(stack) > 0:
+            if profile is not None:
+                now = time.perf_counter()
+                profile.seconds[stack[-1][0].rule] += now - steptime
+                steptime = now
+            if not self.context.withinbudget():
+                self.abandon(stack)
+                return
+            parent, steps = stack[-1]
+            if parent.isvalid and self.context.firstproof:
+                steps.close()
+                stack.pop()
+                node = parent
+                continue
+            if enough is not None and parent is root and len(root.applications) > checked:
+                checked = len(root.applications)
+                if enough(root):
+                    self.abandon(stack)
+                    return
+            try:
+                premise = steps.send(node)
+            except StopIteration:
+                stack.pop()
+                node = parent
+                if profile is not None:
+                    now = time.perf_counter()
+                    profile.seconds[parent.rule] += now - steptime
+                    steptime = now
+                continue
+            node, isnew = self.findnode(*premise)
+            if isnew:
+                stack.append((node, node.prove()))
+                if profile is not None:
+                    node.rule = parent.rule
+                    profile.maxdepth = max(profile.maxdepth, len(stack))
+                node = None
+
+    def abandon(self, stack):
+        for unfinished, steps in reversed(stack):
+            steps.close()
+            self.nodes.pop(self.key(unfinished), None)
+
+    def key(self, node):
+        return normalizesequent(node.constituents, node.goal, node.qrlimit - node.qrcount, node.cooldown)
+
+    def print(self):
+        print('proof table:', len(self.nodes), 'sequents,', self.hits, 'hits,', self.misses, 'misses')
+
+
+# a list of constituents and the goal type
+# a sequence is a view of a node of the proof table for constituents with particular denotations; its subtrees and
+# denotations are only made when they are used
+class Sequence:
+
+    def __init__(self, constituentlist, goaltype, rule, qrcount=0, cooldown=0, prooftable=None, node=None,
+                 qrlimit=None):
+        self.constituents = constituentlist
+        self.goal = goaltype
+        self.ruleused = rule
+        self.qrcount = qrcount
+        self.cooldown = cooldown
+        if prooftable is None:
+            self.prooftable = ProofTable()
+        else:
+            self.prooftable = prooftable
+        if node is None:
+            self.node = self.prooftable.node(constituentlist, goaltype, qrcount, cooldown, qrlimit)
+        else:
+            self.node = node
+        self.isvalid = self.node.isvalid
+        self.subtreelist = None
+        self.denotationlist = None
+        # print(self.constituents)
+
+    @property
+    def subtrees(self):
+        if self.subtreelist is None:
+            self.subtreelist = []
+            values = [constituent.denotation for constituent in self.constituents]
+            for application in self.node.applications:
+                self.subtreelist.append([])
+                for premise in application.premises:
+                    node = premise.node
+                    constituentlist = [Constituent(constituent.syntactictype,
+                                                   substituteall(denotation, self.node.variables, values))
+                                       for constituent, denotation in zip(node.constituents, premise.denotations)]
+                    self.subtreelist[-1].append(Sequence(constituentlist, node.goal, application.rule, node.qrcount,
+                                                         node.cooldown, self.prooftable, node))
+        return self.subtreelist
+
+    @property
+    def denotations(self):
+        if self.denotationlist is None:
+            self.denotationlist = []
+            denotationset = set()
+            values = [constituent.denotation for constituent in self.constituents]
+            for denotation in self.node.getdenotations():
+                adddenotation(self.denotationlist, denotationset,
+                              substituteall(denotation, self.node.variables, values), self.prooftable.context)
+        return self.denotationlist
+
+    # the reading of every derivation in turn, without making the others (so duplicates are included)
+    def iterdenotations(self):
+        values = [constituent.denotation for constituent in self.constituents]
+        for denotation in self.node.iterdenotations():
+            yield substituteall(denotation, self.node.variables, values)
+
+    def countderivations(self):
+        return self.node.countderivations()
+
+    # every derivation in turn, as this sequence and a list of the derivations of the premises of one rule
+    def derivations(self):
+        if self.node.isaxiom:
+            yield self, []
+        for subtree in self.subtrees:
+            for subderivations in combinederivations(subtree):
+                yield self, subderivations
 
     def printstructure(self, layer=0, noindent=False):
         if not noindent:
@@ -439,33 +1278,666 @@ class Sequence:
         return returnstring
 
 
+# every combination of one derivation for each of the sequences
+def combinederivations(sequences):
+    if len(sequences) == 0:
+        yield []
+    else:
+        for derivation in sequences[0].derivations():
+            for otherderivations in combinederivations(sequences[1:]):
+                yield [derivation] + otherderivations
+
+
+# proof nets decide sequents of the Lambek calculus (no gaps, so no qr) without searching rule orders: the types of the
+# sequent are unfolded into formula trees, the constituents negative and the goal positive, and a proof is a linking
+# of their atoms in pairs, each a positive and a negative occurrence of the same atom, with no two links crossing (the
+# atoms are in the order of the sequent), from which a reading can be read off
+# a subformula of a proof net; a function is a tensor link if it is negative and a par link if it is positive, and its
+# argument has the other polarity and its result the same
+class NetFormula:
+
+    __slots__ = ('syntactictype', 'ispositive', 'parent', 'argument', 'result', 'atomindex', 'constituent')
+
+    def __init__(self, syntactictype, ispositive, parent=None):
+        self.syntactictype = syntactictype
+        self.ispositive = ispositive
+        self.parent = parent
+        self.argument = None
+        self.result = None
+        self.atomindex = None
+        self.constituent = None  # the constituent a negative formula tree stands for, if it is not a hypothesis
+
+
+class NotAProofNet(Exception):
+    pass
+
+
+# while a span of a proof net is linked, a partition has for each group the smallest group it has been joined to
+def joinpartition(partition, first, second):
+    low = min(first, second)
+    high = max(first, second)
+    return tuple(low if group == high else group for group in partition)
+
+
+# the partition after a link between two groups, or None if the link closes a cycle that no switching of the par links
+# breaks: a link within a group, or a par link (conclusion, argument, result) with a premise in its own group
+# a par link whose premises are then in one group is contracted, joining them to the group of its conclusion, so that
+# a cycle through any number of par links shows up as a premise in the group of its own par link
+def linkpartition(partition, pars, first, second):
+    if partition[first] == partition[second]:
+        return None
+    partition = joinpartition(partition, partition[first], partition[second])
+    while True:
+        contract = None
+        for par, argument, result in pars:
+            pargroup, argumentgroup, resultgroup = partition[par], partition[argument], partition[result]
+            if argumentgroup != resultgroup and pargroup in (argumentgroup, resultgroup):
+                return None
+            if argumentgroup == resultgroup != pargroup:
+                contract = pargroup, argumentgroup
+        if contract is None:
+            return partition
+        partition = joinpartition(partition, *contract)
+
+
+# what linking a span of atoms among themselves depends on: the group of each atom, and the par links not contracted
+# yet that joining these groups can contract or close a cycle through, with the groups numbered in order of appearance
+# gives it with the group of the partition for each number; spans that only differ in other groups are linked alike
+def spanstate(groups, pars, partition):
+    groups = [partition[group] for group in groups]
+    relevant = set(groups)
+    candidates = [tuple(partition[group] for group in par) for par in pars if partition[par[1]] != partition[par[2]]]
+    chosen = []
+    changed = True
+    while changed:
+        changed = False
+        for par in candidates:
+            if par not in chosen and sum(group in relevant for group in par) >= 2:
+                chosen.append(par)
+                relevant.update(par)
+                changed = True
+    numbers = {}
+    for group in groups + [group for par in chosen for group in par]:
+        numbers.setdefault(group, len(numbers))
+    key = tuple(numbers[group] for group in groups), tuple(tuple(numbers[group] for group in par) for par in chosen)
+    return key, list(numbers)
+
+
+# a partition of the groups of a span, from a partition of the groups it was numbered from (see spanstate)
+def restrictpartition(partition, numbers):
+    first = {}
+    for number, group in enumerate(numbers):
+        first.setdefault(partition[group], number)
+    return tuple(first[partition[group]] for group in numbers)
+
+
+# a sequent proven with proof nets; like a Sequence it has isvalid, denotations and countderivations, over every
+# linking that is a proof
+# linkable has for each span of atoms whether they can be linked among themselves without crossing, which only
+# depends on the atoms, so no link is tried that cannot be completed
+# while linking, a partition joins the parts of the net (groups) held together by tensor links and the links made so
+# far, and no linking is tried further once a link closes a cycle that no switching of the par links breaks (see
+# linkpartition); the spans are linked in a table (see linkspan) whose keys only vary with the constituents cut by
+# the ends of a span, so that for types of bounded order it grows polynomially with the sentence, and only the
+# linkings that get through it are read off
+class ProofNet:
+
+    def __init__(self, constituentlist, goaltype, context=None):
+        self.constituents = constituentlist
+        self.goal = goaltype
+        if context is None:
+            self.context = ParseContext()
+        else:
+            self.context = context
+        self.atoms = []
+        self.roots = []
+        for constituent in constituentlist:
+            formula = self.unfold(constituent.syntactictype, False)
+            formula.constituent = constituent
+            self.roots.append(formula)
+        self.goalformula = self.unfold(goaltype, True)
+        self.link = [None] * len(self.atoms)
+        self.groups = {}
+        self.groupcount = 0
+        self.pars = []
+        for root in self.roots + [self.goalformula]:
+            self.addgroups(root)
+        self.linkable = {}
+        self.spans = {}
+        self.linkings = []  # the links of every linking that is a proof, and its reading
+        if len(constituentlist) > 0 and isbalanced(constituentlist, goaltype):
+            key = spanstate([self.groups[atom] for atom in self.atoms], self.pars, tuple(range(self.groupcount)))[0]
+            for exit in self.linkspan(0, len(self.atoms), key):
+                for linking in self.findlinkings(0, len(self.atoms), key, exit):
+                    reading = self.read()
+                    if reading is not None:
+                        self.linkings.append((list(self.link), reading))
+                        if self.context.firstproof:
+                            break
+                if self.context.firstproof and self.linkings:
+                    break
+        self.isvalid = len(self.linkings) > 0
+        self.denotationlist = None
+
+    # the formula tree of a type, adding its atoms in the order they are in the sequent
+    def unfold(self, syntactictype, ispositive, parent=None):
+        formula = NetFormula(syntactictype, ispositive, parent)
+        if not syntactictype.isfunction:
+            formula.atomindex = len(self.atoms)
+            self.atoms.append(formula)
+            return formula
+        if syntactictype.slashtype == 'left':
+            argumenttype, resulttype = syntactictype.left, syntactictype.right
+        else:
+            argumenttype, resulttype = syntactictype.right, syntactictype.left
+        # the argument of a negative a\b and of a positive b/a comes first
+        if (syntactictype.slashtype == 'left') != ispositive:
+            formula.argument = self.unfold(argumenttype, not ispositive, formula)
+            formula.result = self.unfold(resulttype, ispositive, formula)
+        else:
+            formula.result = self.unfold(resulttype, ispositive, formula)
+            formula.argument = self.unfold(argumenttype, not ispositive, formula)
+        return formula
+
+    # numbers each formula by the group of the formula at the top of the tensor links above it, and collects the par
+    # links with the groups of their premises
+    def addgroups(self, formula):
+        top = formula
+        while top.parent is not None and not top.parent.ispositive:
+            top = top.parent
+        if top is formula:
+            self.groups[formula] = self.groupcount
+            self.groupcount += 1
+        else:
+            self.groups[formula] = self.groups[top]
+        if formula.atomindex is None:
+            self.addgroups(formula.argument)
+            self.addgroups(formula.result)
+            if formula.ispositive:
+                self.pars.append((self.groups[formula], self.groups[formula.argument], self.groups[formula.result]))
+
+    def canlink(self, first, second):
+        firstatom = self.atoms[first]
+        secondatom = self.atoms[second]
+        return firstatom.syntactictype is secondatom.syntactictype and firstatom.ispositive != secondatom.ispositive
+
+    # whether the atoms from start to end can be linked among themselves without crossing
+    def islinkable(self, start, end):
+        if start == end:
+            return True
+        result = self.linkable.get((start, end))
+        if result is None:
+            result = (end - start) % 2 == 0 and any(self.canlink(start, partner) and
+                                                    self.islinkable(start + 1, partner) and
+                                                    self.islinkable(partner + 1, end)
+                                                    for partner in range(start + 1, end, 2))
+            self.linkable[start, end] = result
+        return result
+
+    # the partitions the atoms from start to end can be linked among themselves in, without crossing or closing a
+    # cycle, from the span state key (see spanstate) with no groups joined; each has the ways to get there, as the
+    # partner of the first atom, the partition after that link and the partition after linking the atoms inside it
+    # linkings that leave the same partition can be completed in the same ways, and spans with the same key are linked
+    # alike, so the table holds each span and key once
+    def linkspan(self, start, end, key):
+        exits = self.spans.get((start, end, key))
+        if exits is None:
+            groups, pars = key
+            unjoined = tuple(range(len(set(groups).union(*pars))))
+            exits = {}
+            if start == end:
+                exits[unjoined] = []
+            elif self.context.withinbudget():
+                self.context.nodecount += 1
+                for partner in range(start + 1, end, 2):
+                    if self.canlink(start, partner) and self.islinkable(start + 1, partner) and \
+                            self.islinkable(partner + 1, end):
+                        linked = linkpartition(unjoined, pars, groups[0], groups[partner - start])
+                        if linked is None:
+                            continue
+                        for inside in self.linksubspan(start + 1, partner, start, key, linked):
+                            for outside in self.linksubspan(partner + 1, end, start, key, inside):
+                                exits.setdefault(outside, []).append((partner, linked, inside))
+            self.spans[start, end, key] = exits
+        return exits
+
+    # the partitions of a span (from spanstart, with key) after linking the atoms from start to end within it, from
+    # a partition of its groups
+    def linksubspan(self, start, end, spanstart, key, partition):
+        groups, pars = key
+        subkey, numbers = spanstate(groups[start - spanstart:end - spanstart], pars, partition)
+        for exit in self.linkspan(start, end, subkey):
+            joined = partition
+            for number, group in enumerate(exit):
+                joined = joinpartition(joined, joined[numbers[number]], joined[numbers[group]])
+            yield joined
+
+    # every linking of the atoms from start to end that leaves the partition exit, each in turn left in link
+    def findlinkings(self, start, end, key, exit):
+        if start == end:
+            yield self.link
+            return
+        groups, pars = key
+        for partner, linked, inside in self.spans[start, end, key][exit]:
+            self.link[start] = partner
+            self.link[partner] = start
+            insidekey, insidenumbers = spanstate(groups[1:partner - start], pars, linked)
+            outsidekey, outsidenumbers = spanstate(groups[partner + 1 - start:], pars, inside)
+            for insidelinking in self.findlinkings(start + 1, partner, insidekey,
+                                                   restrictpartition(inside, insidenumbers)):
+                yield from self.findlinkings(partner + 1, end, outsidekey, restrictpartition(exit, outsidenumbers))
+
+    # the reading of the linking in link, or None if it is not a proof: the term must use every constituent and
+    # hypothesis once, a hypothesis only within its abstraction, and (since the Lambek calculus has no empty
+    # sequences) every abstraction something besides its hypothesis
+    def read(self):
+        self.variables = {}  # the variable of each hypothesis whose abstraction is being read
+        self.used = set()
+        self.visited = set()
+        self.uses = 0
+        try:
+            reading = self.positiveterm(self.goalformula)
+        except NotAProofNet:
+            return None
+        if len(self.used) != len(self.roots) + len(self.variables) or len(self.visited) * 2 != len(self.atoms):
+            return None
+        return reading
+
+    # the term of a positive formula: an atom is the term of the negative atom it is linked to, and a par link
+    # abstracts over the hypothesis that is its argument
+    def positiveterm(self, formula):
+        if formula.atomindex is not None:
+            if formula.atomindex in self.visited:
+                raise NotAProofNet()
+            self.visited.add(formula.atomindex)
+            return self.negativeterm(self.atoms[self.link[formula.atomindex]])
+        variable = self.variables[formula.argument] = newvariable(self.context)
+        usesbefore = self.uses
+        body = self.positiveterm(formula.result)
+        if formula.argument not in self.used or self.uses - usesbefore < 2:
+            raise NotAProofNet()
+        self.uses -= 1
+        del self.variables[formula.argument]
+        self.used.discard(formula.argument)
+        return abstract(body, variable)
+
+    # the term of a negative atom: the constituent or hypothesis at the top of the tensor links above it, applied to
+    # the term of the argument of each of them in turn
+    def negativeterm(self, atom):
+        formula = atom
+        while formula.parent is not None and not formula.parent.ispositive:
+            formula = formula.parent
+        if formula in self.used:
+            raise NotAProofNet()
+        if formula.constituent is not None:
+            term = formula.constituent.denotation
+        elif formula in self.variables:
+            term = self.variables[formula]
+        else:
+            raise NotAProofNet()
+        self.used.add(formula)
+        self.uses += 1
+        while formula is not atom:
+            term = apply(term, self.positiveterm(formula.argument))
+            formula = formula.result
+        return term
+
+    @property
+    def denotations(self):
+        if self.denotationlist is None:
+            self.denotationlist = []
+            denotationset = set()
+            for links, reading in self.linkings:
+                adddenotation(self.denotationlist, denotationset, reading, self.context)
+        return self.denotationlist
+
+    def countderivations(self):
+        return len(self.linkings)
+
+    def printstructure(self):
+        print(self, '   by proof net', len(self.denotations), self.denotations)
+        for links, reading in self.linkings:
+            print('    ', ' '.join('{}{}-{}'.format(self.atoms[first].syntactictype, first, second)
+                                  for first, second in enumerate(links) if first < second), '  ', reading)
+
+    def __repr__(self):
+        returnstring = ''
+        for item in self.constituents:
+            returnstring += repr(item.syntactictype) + ' '
+        returnstring += '⊦ ' + repr(self.goal)
+        return returnstring
+
+
+# enumerates the lexical assignments of a sentence (one constituent per word) left to right, dropping a partial
+# assignment as soon as no choice of constituents for the remaining words can balance its atom counts against the goal
+# generated counts the assignments produced, pruned counts the full assignments that were never produced
+class Assignments:
+
+    def __init__(self, constituents, goaltype):
+        self.constituents = constituents
+        self.goaltype = goaltype
+        self.generated = 0
+        self.pruned = 0
+
+        self.atoms = set(goaltype.atomcount)
+        for wordconstituents in self.constituents:
+            for constituent in wordconstituents:
+                self.atoms.update(constituent.syntactictype.atomcount)
+
+        # lowest and highest count of each atom that the words from each position onward can add up to, and the
+        # number of full assignments of those words
+        self.mincounts = [dict.fromkeys(self.atoms, 0)]
+        self.maxcounts = [dict.fromkeys(self.atoms, 0)]
+        self.completions = [1]
+        for wordconstituents in reversed(self.constituents):
+            mincount = {}
+            maxcount = {}
+            for atom in self.atoms:
+                counts = [constituent.syntactictype.atomcount.get(atom, 0) for constituent in wordconstituents]
+                mincount[atom] = self.mincounts[0][atom] + min(counts, default=0)
+                maxcount[atom] = self.maxcounts[0][atom] + max(counts, default=0)
+            self.mincounts.insert(0, mincount)
+            self.maxcounts.insert(0, maxcount)
+            self.completions.insert(0, self.completions[0] * len(wordconstituents))
+
+    def __iter__(self):
+        return self.extend((), dict.fromkeys(self.atoms, 0), 0)
+
+    def extend(self, assignment, balance, position):
+        if position == len(self.constituents):
+            self.generated += 1
+            yield assignment
+            return
+        for constituent in self.constituents[position]:
+            newbalance = dict(balance)
+            for atom, count in constituent.syntactictype.atomcount.items():
+                newbalance[atom] += count
+            if self.ispossible(newbalance, position + 1):
+                yield from self.extend(assignment + (constituent,), newbalance, position + 1)
+            else:
+                self.pruned += self.completions[position + 1]
+
+    def ispossible(self, balance, position):
+        for atom in self.atoms:
+            goalcount = self.goaltype.atomcount.get(atom, 0)
+            if not balance[atom] + self.mincounts[position][atom] <= goalcount <= \
+                    balance[atom] + self.maxcounts[position][atom]:
+                return False
+        return True
+
+
+# the type of two adjacent function types composed, or None; crossed composition (A/B with C\B, and B/C with B\A)
+# does not keep the order of the words
+def composition(lefttype, righttype, crossed):
+    if not lefttype.isfunction or not righttype.isfunction:
+        return None
+    with typelock:
+        if lefttype.slashtype == 'right' and righttype.slashtype == 'right' and lefttype.right is righttype.left:
+            return functiontype('right', lefttype.left, righttype.right)
+        if lefttype.slashtype == 'left' and righttype.slashtype == 'left' and lefttype.right is righttype.left:
+            return functiontype('left', lefttype.left, righttype.right)
+        if not crossed:
+            return None
+        if lefttype.slashtype == 'right' and righttype.slashtype == 'left' and lefttype.right is righttype.right:
+            return functiontype('left', righttype.left, lefttype.left)
+        if lefttype.slashtype == 'right' and righttype.slashtype == 'left' and lefttype.left is righttype.left:
+            return functiontype('right', righttype.right, lefttype.right)
+    return None
+
+
+# the type a scope taking type stands in for, the clause type it takes scope over, and the type it makes of the
+# clause, or None if it does not take scope
+def lowering(syntactictype):
+    if syntactictype.slashtype == 'right' and syntactictype.right.slashtype == 'left':
+        return syntactictype.right.left, syntactictype.right.right, syntactictype.left
+    if syntactictype.slashtype == 'left' and syntactictype.left.slashtype == 'right':
+        return syntactictype.left.right, syntactictype.left.left, syntactictype.right
+    return None
+
+
+# a prefilter for lexical assignments: a chart that combines adjacent types by application (as in tlg_parser) and by
+# composition (crossed as well if a type of the sentence takes scope, since qr can reorder); it lowers a type that
+# takes scope, such as s/(dp\s) or q/(dp\s), to the type it stands in for (dp), remembering the clause type it takes
+# scope over (s) and the type it then makes (s or q), and lifts a type to a scope taking type of the sentence that
+# stands in for it
+# it has no hypothetical reasoning, so it can miss proofs whose goal is a function (b, (b\b)/a ⊦ b/a) or that use a
+# type with a function argument ((a/a)/(a\a), a ⊦ a), and qr used more than once moves constituents in ways it does
+# not follow (dp\s s/(dp\s) ⊦ s is proven with qr used twice); canreject tells when it can be trusted to reject, and
+# checkprefilter compares it with the full search
+class ABChart:
+
+    def __init__(self, syntactictypes, goaltype):
+        self.length = len(syntactictypes)
+        self.goaltype = goaltype
+        self.scopes = set()  # (clause type, type made of it) of every lowered type
+        self.lifts = defaultdict(set)  # the scope taking types of the sentence, by the type they stand in for
+        for syntactictype in syntactictypes:
+            for subtype in self.resulttypes(syntactictype):
+                lowered = lowering(subtype)
+                if lowered is not None:
+                    self.lifts[lowered[0]].add(subtype)
+        self.cells = {}
+        for position, syntactictype in enumerate(syntactictypes):
+            self.cells[position, position + 1] = self.close({syntactictype})
+        for length in range(2, self.length + 1):
+            for start in range(self.length - length + 1):
+                end = start + length
+                cell = set()
+                for split in range(start + 1, end):
+                    for lefttype in self.cells[start, split]:
+                        for righttype in self.cells[split, end]:
+                            result, rule = elimination(lefttype, righttype)
+                            if result is not None:
+                                cell.add(result)
+                            result = composition(lefttype, righttype, len(self.lifts) > 0)
+                            if result is not None:
+                                cell.add(result)
+                self.cells[start, end] = self.close(cell)
+
+    # a type and the types it gives once its arguments are taken, such as s/(dp\s) from (s/(dp\s))/n
+    def resulttypes(self, syntactictype):
+        yield syntactictype
+        while syntactictype.isfunction:
+            syntactictype = syntactictype.top
+            yield syntactictype
+
+    # adds the lowered type of each scope taking type of a cell, and the scope taking types each type can be lifted to
+    def close(self, cell):
+        agenda = list(cell)
+        while len(agenda) > 0:
+            syntactictype = agenda.pop()
+            newtypes = list(self.lifts.get(syntactictype, ()))
+            if syntactictype.isfunction:
+                lowered = lowering(syntactictype)
+                if lowered is not None:
+                    self.scopes.add(lowered[1:])
+                    newtypes.append(lowered[0])
+            for newtype in newtypes:
+                if newtype not in cell:
+                    cell.add(newtype)
+                    agenda.append(newtype)
+        return cell
+
+    # whether the types make the goal, taking scope over the whole sentence if need be
+    def recognizes(self):
+        if self.length == 0:
+            return False
+        sentencetypes = self.cells[0, self.length]
+        if self.goaltype in sentencetypes:
+            return True
+        return any(clausetype in sentencetypes and madetype is self.goaltype for clausetype, madetype in self.scopes)
+
+
+# whether an ABChart can reject assignments of the types: the goal is an atom, no type has a function argument, and
+# the sequent engine uses qr at most once (see ABChart)
+def canreject(syntactictypes, goaltype, context):
+    if goaltype.isfunction or any(syntactictype.ishigherorder for syntactictype in syntactictypes):
+        return False
+    return context.engine != 'sequent' or context.qrlimit <= 1
+
+
 class Chart:
 
-    def __init__(self, lexicon, sentence, goaltype=None):
+    def __init__(self, lexicon, sentence, goaltype=None, prooftable=None, context=None):
 
         self.lexicon = lexicon
         self.words = sentence.split(' ')
         if goaltype is None:
-            self.goaltype = SyntacticType('s')
+            self.goaltype = maketype('s')
         else:
             self.goaltype = goaltype
+        if prooftable is None:
+            self.prooftable = ProofTable(context)
+        else:
+            self.prooftable = prooftable
+        self.context = self.prooftable.context
         self.constituents = []
         self.basesequences = []
         self.isvalid = False
 
+        # a word with no entries leaves nothing to prove, which is found before any search
+        self.unknownwords = self.lexicon.unknownwords(self.words)
+        self.rounds = []
+        self.truncated = False
+        self.readinglist = []  # with maxreadings, the distinct readings found so far
+        self.readingset = set()
+        self.rejected = 0  # assignments the prefilter did not recognize and dropped
+        self.prefiltermode = None  # how the prefilter is used (see below)
+        self.searched = 0  # assignments given to proof search (at the last qr limit)
+        self.unfinished = 0  # of them, those not proven when the budget ran out
+        if len(self.unknownwords) > 0 and len(self.lexicon.backoff) == 0:
+            self.agenda = None
+            return
+
         for word in self.words:
-            wordtypes = self.lexicon.entrytypes[word]
-            denotations = self.lexicon.denotations[word]
+            wordtypes, denotations = self.lexicon.getentries(word)
             self.constituents.append([])
             for i in range(len(wordtypes)):
-                self.constituents[-1].append(Constituent(wordtypes[i], Denotation(denotations[i])))
-
-        self.agenda = itertools.product(*self.constituents)
-        for constituentlist in self.agenda:
-            testbasesequence = Sequence(list(constituentlist), self.goaltype, 'LEX')
-            if testbasesequence.isvalid:
-                self.basesequences.append(testbasesequence)
-                self.isvalid = True
+                self.constituents[-1].append(Constituent(wordtypes[i], denotations[i]))
+
+        # with deepening, the sentence is proven with each qr limit in turn, so that the readings with the fewest uses
+        # of qr are found first, and are complete even if the budget runs out at a higher limit; basesequences are
+        # those of the last limit, and rounds has the base sequences of every limit
+        # with firstproof, the search stops at the first valid assignment, and with maxreadings, once the sentence has
+        # that many readings (which may be in the middle of the search of an assignment)
+        # with a prefilter, the assignments an ABChart recognizes are searched first ('rank'), or only they are
+        # ('reject'); ranking makes every assignment before the search, as deepening does, while rejecting drops
+        # each assignment the ABChart does not recognize as it is reached
+        # the ABChart can miss proofs (see canreject), so for a sentence whose goal or entries it cannot be trusted
+        # with, it only ranks
+        self.agenda = Assignments(self.constituents, self.goaltype)
+        self.prefiltermode = self.context.prefilter
+        if self.prefiltermode == 'reject' and not canreject([constituent.syntactictype for entries in
+                                                             self.constituents for constituent in entries],
+                                                            self.goaltype, self.context):
+            self.prefiltermode = 'rank'
+        if self.prefiltermode == 'rank':
+            assignments = self.rank(self.agenda)
+        elif self.prefiltermode == 'reject':
+            assignments = self.recognized(self.agenda)
+        else:
+            assignments = self.agenda
+        if self.context.deepening and not isinstance(assignments, list):
+            assignments = list(assignments)
+        if self.context.engine == 'proofnet':
+            qrlimits = [0]
+        elif self.context.deepening:
+            qrlimits = range(self.context.qrlimit + 1)
+        else:
+            qrlimits = [self.context.qrlimit]
+        self.rounds = []
+        self.context.startsearch()
+        for qrlimit in qrlimits:
+            self.basesequences = []
+            self.rounds.append(self.basesequences)
+            self.searched = 0
+            self.unfinished = 0
+            for constituentlist in assignments:
+                constituentlist = list(constituentlist)
+                self.searched += 1
+                if self.context.engine == 'proofnet':
+                    starttime = time.perf_counter()
+                    testbasesequence = ProofNet(constituentlist, self.goaltype, self.context)
+                    if self.context.profile is not None:
+                        self.context.profile.seconds['LEX'] += time.perf_counter() - starttime
+                else:
+                    enough = None
+                    if self.context.maxreadings is not None:
+                        enough = functools.partial(self.hasenoughreadings,
+                                                   [constituent.denotation for constituent in constituentlist])
+                    node = self.prooftable.node(constituentlist, self.goaltype, 0, 0, qrlimit, enough)
+                    testbasesequence = Sequence(constituentlist, self.goaltype, 'LEX', prooftable=self.prooftable,
+                                                node=node)
+                if self.context.profile is not None:
+                    self.context.profile.attempts['LEX'] += 1
+                    if testbasesequence.isvalid:
+                        self.context.profile.successes['LEX'] += 1
+                if self.context.truncated and not testbasesequence.isvalid:
+                    self.unfinished += 1
+                if testbasesequence.isvalid:
+                    self.basesequences.append(testbasesequence)
+                    self.isvalid = True
+                    if self.context.maxreadings is not None:
+                        for denotation in testbasesequence.denotations:
+                            adddenotation(self.readinglist, self.readingset, denotation, self.context)
+                if self.isfinished():
+                    break
+            if self.isfinished():
+                break
+        self.truncated = self.context.truncated
+
+    def isrecognized(self, assignment):
+        return ABChart([constituent.syntactictype for constituent in assignment], self.goaltype).recognizes()
+
+    # the assignments, those the ABChart recognizes first
+    def rank(self, assignments):
+        recognized = []
+        others = []
+        for assignment in assignments:
+            if self.isrecognized(assignment):
+                recognized.append(assignment)
+            else:
+                others.append(assignment)
+        return recognized + others
+
+    # the assignments the ABChart recognizes, counting the others in rejected
+    def recognized(self, assignments):
+        for assignment in assignments:
+            if self.isrecognized(assignment):
+                yield assignment
+            else:
+                self.rejected += 1
+
+    # how many lexical assignments each stage of the parse eliminated, after the number there are: the count invariant
+    # (see Assignments), the prefilter (when it rejects), and proof search, then the number the budget cut off before
+    # they were proven (see ParseContext), and the number that are valid
+    # assignments the search did not reach, since it stopped early, are in none of them
+    def stages(self):
+        if self.agenda is None:
+            return [('assignments', 0), ('count invariant', 0), ('prefilter', 0), ('proof search', 0), ('budget', 0),
+                    ('valid', 0)]
+        return [('assignments', self.agenda.completions[0]), ('count invariant', self.agenda.pruned),
+                ('prefilter', self.rejected),
+                ('proof search', self.searched - self.unfinished - len(self.basesequences)),
+                ('budget', self.unfinished), ('valid', len(self.basesequences))]
+
+    # whether the search can stop: the budget has run out, or the sentence has as many proofs or readings as asked for
+    def isfinished(self):
+        if self.context.truncated or self.context.firstproof and self.isvalid:
+            return True
+        return self.context.maxreadings is not None and len(self.readinglist) >= self.context.maxreadings
+
+    # whether the readings found so far, with those of the rules found so far for node, make maxreadings
+    def hasenoughreadings(self, values, node):
+        denotations = list(self.readinglist)
+        denotationset = set(self.readingset)
+        for application in node.applications:
+            for denotation in application.denotations(Premise.getdenotations):
+                adddenotation(denotations, denotationset, substituteall(denotation, node.variables, values),
+                              self.context)
+                if len(denotations) >= self.context.maxreadings:
+                    return True
+        return False
 
     def printstructure(self):
         denotationlist = []
@@ -476,6 +1948,31 @@ class Chart:
         print(str(self), 'TOTAL:', len(denotationlist), denotationlist)
         # NOTE: this does not (yet) reduce duplicate denotations
 
+    # parses a sentence as written; a sentence ending in a question mark has the goal q instead of s
+    @classmethod
+    def parse(cls, lexicon, sentence, context=None):
+        if sentence[-1] == '?' or sentence[-1] == '？':
+            return cls(lexicon, sentence[:-1], maketype('q'), context=context)
+        else:
+            return cls(lexicon, sentence, context=context)
+
+    # the distinct readings of the sentence, over every lexical assignment (and with deepening, those with fewer uses
+    # of qr first); with maxreadings, only the first that many
+    def readings(self):
+        denotations = []
+        denotationset = set()
+        for basesequences in self.rounds:
+            for basesequence in basesequences:
+                for denotation in basesequence.denotations:
+                    adddenotation(denotations, denotationset, denotation, self.context)
+        if self.context.maxreadings is not None:
+            return denotations[:self.context.maxreadings]
+        return denotations
+
+    # the number of derivations of the sentence, without building them
+    def countderivations(self):
+        return sum(basesequence.countderivations() for basesequence in self.basesequences)
+
     def printsentence(self):
         print(repr(self))
 
@@ -483,13 +1980,383 @@ class Chart:
         return ' '.join(self.words)
 
 
-lexiconsource = Lexicon(open(lexiconfilename, 'r').read())
-sentencelist = open(sentencefilename, 'r').read().split('\n')
+# loads each lexicon once, and gives the same lexicon to every chart (and every thread) that asks for it again; a
+# lexicon is asked for by language, or by file name, and with the way it is loaded and its backoff types
+class LexiconService:
+
+    def __init__(self):
+        self.lexicons = {}
+        self.lock = threading.Lock()
+
+    def get(self, lexiconfilename=None, lexiconcache=False, backoff=None, language=None):
+        if lexiconfilename is None:
+            lexiconfilename = lexiconpath(language)
+        key = (os.path.abspath(lexiconfilename), lexiconcache, None if backoff is None else tuple(backoff))
+        with self.lock:
+            lexicon = self.lexicons.get(key)
+            if lexicon is None:
+                if lexiconcache:
+                    lexicon = Lexicon.from_cache(lexiconfilename, backoff=backoff)
+                else:
+                    lexicon = Lexicon.from_file(lexiconfilename, backoff)
+                self.lexicons[key] = lexicon
+        return lexicon
+
+
+# the lexicons of this process
+lexiconservice = LexiconService()
+
+
+# batch parsing: sentences are parsed in a pool of worker processes, each of which loads the lexicon once, and the
+# results are given back in the order of the sentences as they are finished
+
+# the result of parsing one sentence; denotations are the distinct readings, as strings, or None if only whether the
+# sentence is valid was asked for (firstproof)
+class BatchResult:
+
+    def __init__(self, index, sentence, isvalid, denotations, parsetime, timedout=False, error=None,
+                 unknownwords=None, truncated=False, stages=None, profile=None):
+        self.index = index
+        self.sentence = sentence
+        self.isvalid = isvalid
+        self.denotations = denotations
+        if denotations is None:
+            self.readingcount = None
+        else:
+            self.readingcount = len(denotations)
+        self.time = parsetime
+        self.timedout = timedout
+        self.error = error
+        self.truncated = truncated  # the search ran out of its node or time budget
+        self.stages = stages  # see Chart.stages
+        self.profile = profile  # the RuleProfile of the parse as a dict (see RuleProfile.asdict), if one was kept
+        if unknownwords is None:
+            self.unknownwords = []
+        else:
+            self.unknownwords = unknownwords
+
+    def __repr__(self):
+        if self.timedout:
+            return '{}   timed out after {:.3f}s'.format(self.sentence, self.time)
+        if self.error is not None:
+            return '{}   error: {}'.format(self.sentence, self.error)
+        if self.denotations is None:
+            returnstring = '{}   {} {:.3f}s'.format(self.sentence, self.isvalid, self.time)
+        else:
+            returnstring = '{}   {} {} {:.3f}s {}'.format(self.sentence, self.isvalid, self.readingcount, self.time,
+                                                         self.denotations)
+        if self.truncated:
+            returnstring += '   truncated'
+        if len(self.unknownwords) > 0:
+            returnstring += '   unknown words: ' + ' '.join(self.unknownwords)
+        return returnstring
+
+
+class SentenceTimeout(Exception):
+    pass
+
+
+# the state of a worker process, set once by startworker
+workerlexicon = None
+workersettings = None
+
+
+def startworker(lexiconfilename, settings, lexiconcache, backoff):
+    global workerlexicon, workersettings
+    workerlexicon = lexiconservice.get(lexiconfilename, lexiconcache, backoff)
+    workersettings = settings
 
-for line in sentencelist:
-    if line[-1] == '?' or line[-1] == '？':
-        chart = Chart(lexiconsource, line[:-1], SyntacticType('q'))
+
+def raisetimeout(signalnumber, frame):
+    raise SentenceTimeout()
+
+
+# parses one sentence in a worker; the timer is a real time interval timer, so a sentence that takes too long is
+# stopped wherever its search is
+# the timer is stopped as soon as the parse is done, still within the try that catches its timeout, so that a timeout
+# that comes before the timer is stopped is caught, and none can come while the result is made
+# any other error (say a bad type in the lexicon, or too deep a recursion) fails only its own sentence
+def parsebatchsentence(task):
+    index, sentence, timeout = task
+    context = ParseContext(*workersettings)
+    starttime = time.perf_counter()
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, raisetimeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        try:
+            chart = Chart.parse(workerlexicon, sentence, context)
+            if context.firstproof:
+                denotations = None
+            else:
+                denotations = [repr(denotation) for denotation in chart.readings()]
+        finally:
+            if timeout is not None:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except SentenceTimeout:
+        return BatchResult(index, sentence, False, [], time.perf_counter() - starttime, timedout=True)
+    except Exception as error:
+        return BatchResult(index, sentence, False, [], time.perf_counter() - starttime, error=repr(error))
+    if context.profile is None:
+        profile = None
+    else:
+        profile = context.profile.asdict()
+    return BatchResult(index, sentence, chart.isvalid, denotations, time.perf_counter() - starttime,
+                       unknownwords=chart.unknownwords, truncated=chart.truncated, stages=chart.stages(),
+                       profile=profile)
+
+
+# parses every sentence of a file or other iterable of lines (blank lines are skipped) and yields a BatchResult for
+# each, in input order; timeout is in seconds per sentence, and needs signal.setitimer (not on Windows)
+# with lexiconcache, the workers load the lexicon through its cache (see Lexicon.from_cache)
+# the lexicon is loaded through lexiconservice before the workers start, so that workers made by forking this process
+# share it instead of loading it again
+# nodebudget, timebudget and deepening bound the search of each sentence as in ParseContext; unlike timeout, a sentence
+# that runs out of its budget still gives the readings found so far
+# with firstproof, each sentence is only checked for validity; with maxreadings, at most that many readings are found
+# focused, prefilter and engine choose how each sentence is proven, as in ParseContext; with profile, each result has
+# the profile of its parse
+def parsebatch(lexiconfilename, sentences, processes=None, timeout=None, qrlimit=1, cooldownperiod=2,
+               uniquedenotations=True, lexiconcache=False, backoff=None, nodebudget=None, timebudget=None,
+               deepening=False, firstproof=False, maxreadings=None, focused=False, prefilter=None, engine='sequent',
+               profile=False):
+    if timeout is not None and not hasattr(signal, 'setitimer'):
+        raise Exception('Sentence timeouts need signal.setitimer, which this platform does not have')
+    lexiconservice.get(lexiconfilename, lexiconcache, backoff)
+    tasks = ((index, sentence, timeout)
+             for index, sentence in enumerate(line.strip() for line in sentences if line.strip() != ''))
+    with multiprocessing.Pool(processes, startworker,
+                              (lexiconfilename,
+                               (qrlimit, cooldownperiod, uniquedenotations, nodebudget, timebudget, deepening,
+                                firstproof, maxreadings, focused, prefilter, engine, profile),
+                               lexiconcache, backoff)) as pool:
+        yield from pool.imap(parsebatchsentence, tasks)
+
+
+# parses each sentence with two sets of ParseContext settings, and gives back the sentences whose readings differ, as
+# (sentence, readings only the first parse found, readings only the second parse found), and for each parse the number
+# of sequents it proved (or spans it linked) and of derivations it found over all the sentences
+def compareparses(lexicon, sentences, firstsettings, secondsettings):
+    differences = []
+    firstcounts = [0, 0]
+    secondcounts = [0, 0]
+    for sentence in (line.strip() for line in sentences if line.strip() != ''):
+        firstchart = Chart.parse(lexicon, sentence, ParseContext(**firstsettings))
+        secondchart = Chart.parse(lexicon, sentence, ParseContext(**secondsettings))
+        firstreadings = set(firstchart.readings())
+        secondreadings = set(secondchart.readings())
+        if firstreadings != secondreadings or firstchart.isvalid != secondchart.isvalid:
+            differences.append((sentence, firstreadings - secondreadings, secondreadings - firstreadings))
+        for counts, chart in (firstcounts, firstchart), (secondcounts, secondchart):
+            counts[0] += chart.context.nodecount
+            counts[1] += chart.countderivations()
+    return differences, firstcounts, secondcounts
+
+
+# compares the full search with the focused search
+def checkfocused(lexicon, sentences, qrlimit=1, cooldownperiod=2):
+    return compareparses(lexicon, sentences, dict(qrlimit=qrlimit, cooldownperiod=cooldownperiod),
+                         dict(qrlimit=qrlimit, cooldownperiod=cooldownperiod, focused=True))
+
+
+# compares the sequent engine without qr with the proof-net engine
+def checkproofnets(lexicon, sentences, cooldownperiod=2):
+    return compareparses(lexicon, sentences, dict(qrlimit=0, cooldownperiod=cooldownperiod),
+                         dict(qrlimit=0, cooldownperiod=cooldownperiod, engine='proofnet'))
+
+
+# compares the prefilter with the full search on count random sequents of up to maxlength types of the lexicon, each
+# with one of the types or their heads as its goal: gives the sequents the prefilter rejects (see canreject) that are
+# proven, how many it rejected, and how many of those the search did not finish within nodebudget
+def checkprefilter(lexicon, count=1000, maxlength=5, qrlimit=1, cooldownperiod=2, engine='sequent', seed=0,
+                   nodebudget=20000):
+    generator = random.Random(seed)
+    syntactictypes = set()
+    for word in lexicon.words():
+        syntactictypes.update(lexicon.getentries(word)[0])
+    syntactictypes = sorted(syntactictypes, key=repr)
+    goaltypes = sorted(set(syntactictypes) | {syntactictype.head for syntactictype in syntactictypes}, key=repr)
+    falserejections = []
+    rejected = 0
+    unfinished = 0
+    for counter in range(count):
+        sequenttypes = [generator.choice(syntactictypes) for position in range(generator.randint(1, maxlength))]
+        goaltype = generator.choice(goaltypes)
+        context = ParseContext(qrlimit, cooldownperiod, nodebudget=nodebudget, engine=engine)
+        if not canreject(sequenttypes, goaltype, context) or ABChart(sequenttypes, goaltype).recognizes():
+            continue
+        rejected += 1
+        constituentlist = [Constituent(syntactictype, Constant('w' + str(position)))
+                           for position, syntactictype in enumerate(sequenttypes)]
+        if engine == 'proofnet':
+            isvalid = ProofNet(constituentlist, goaltype, context).isvalid
+        else:
+            isvalid = Sequence(constituentlist, goaltype, 'LEX', prooftable=ProofTable(context)).isvalid
+        if context.truncated:
+            unfinished += 1
+        elif isvalid:
+            falserejections.append((sequenttypes, goaltype))
+    return falserejections, rejected, unfinished
+
+
+# adds the counts of each stage of one parse (see Chart.stages) to the totals so far
+def addstages(totals, stages):
+    if totals is None:
+        return list(stages)
+    return [(name, total + count) for (name, total), (stagename, count) in zip(totals, stages)]
+
+
+def printstages(title, stages):
+    if stages is not None:
+        print(title + ':', ', '.join('{} {}'.format(name, count) for name, count in stages))
+
+
+# the rule profiles of the sentences of a corpus, given as (sentence, RuleProfile), and their total, as plain data
+def profilereport(sentenceprofiles):
+    total = RuleProfile()
+    for sentence, profile in sentenceprofiles:
+        total.add(profile)
+    return {'sentences': [{'sentence': sentence, 'profile': profile.asdict()}
+                          for sentence, profile in sentenceprofiles],
+            'total': total.asdict()}
+
+
+def printprofiles(sentenceprofiles, profilefilename=None):
+    total = RuleProfile()
+    for sentence, profile in sentenceprofiles:
+        total.add(profile)
+    total.print('all sentences:')
+    if profilefilename is not None:
+        with open(profilefilename, 'w', encoding='utf-8') as profilefile:
+            json.dump(profilereport(sentenceprofiles), profilefile, indent=1, ensure_ascii=False)
+
+
+def main(arguments=None):
+    argumentparser = argparse.ArgumentParser(description='Parse sentences with the sequent calculus.')
+    argumentparser.add_argument('--language', default='english', help='language of the bundled lexicon and sentences')
+    argumentparser.add_argument('--lexicon', help='lexicon file (default: the bundled lexicon of the language)')
+    argumentparser.add_argument('--sentences', help='sentence file (default: the bundled sentences of the language)')
+    argumentparser.add_argument('--qrlimit', type=int, default=1,
+                                help='maximum number of times qr can be used in a branch of a derivation')
+    argumentparser.add_argument('--cooldown', type=int, default=2,
+                                help='how many lines must be between abstraction out and in')
+    argumentparser.add_argument('--keepduplicates', action='store_true', help='keep equivalent denotations')
+    argumentparser.add_argument('--batch', action='store_true',
+                                help='parse in a pool of processes, printing one line per sentence')
+    argumentparser.add_argument('--processes', type=int, help='number of processes for --batch')
+    argumentparser.add_argument('--timeout', type=float, help='seconds allowed per sentence for --batch')
+    argumentparser.add_argument('--lexiconcache', action='store_true',
+                                help='load the lexicon through a compiled cache, written next to it when needed')
+    argumentparser.add_argument('--backoff', action='append',
+                                help='type given to words that are not in the lexicon (can be repeated)')
+    argumentparser.add_argument('--nodebudget', type=int, help='maximum number of sequents to prove per sentence')
+    argumentparser.add_argument('--timebudget', type=float, help='maximum number of seconds to search per sentence')
+    argumentparser.add_argument('--deepening', action='store_true',
+                                help='search with a qr limit of 0, then 1, up to --qrlimit')
+    argumentparser.add_argument('--firstproof', action='store_true',
+                                help='only find whether each sentence is valid, stopping at its first derivation')
+    argumentparser.add_argument('--maxreadings', type=int, help='stop once a sentence has this many readings')
+    argumentparser.add_argument('--focused', action='store_true',
+                                help='search the parts of a proof without qr or gaps only in normal form')
+    argumentparser.add_argument('--checkfocused', action='store_true',
+                                help='check that the focused search finds the same readings as the full search')
+    argumentparser.add_argument('--prefilter', choices=['rank', 'reject'],
+                                help='search the lexical assignments an AB chart recognizes first, or only those '
+                                     '(rejecting ranks instead with a qr limit above 1)')
+    argumentparser.add_argument('--engine', choices=['sequent', 'proofnet'], default='sequent',
+                                help='prove with sequent search, or with proof nets (which ignore --qrlimit)')
+    argumentparser.add_argument('--checkproofnets', action='store_true',
+                                help='check that the proof-net engine finds the same readings as the sequent engine '
+                                     'without qr')
+    argumentparser.add_argument('--checkprefilter', type=int, metavar='COUNT',
+                                help='check on COUNT random sequents of the lexicon that the prefilter only rejects '
+                                     'what the full search does not prove')
+    argumentparser.add_argument('--profile', action='store_true',
+                                help='print the attempts, successes, failures and time of each rule per sentence')
+    argumentparser.add_argument('--profilefile',
+                                help='write the rule profile of each sentence and of all of them to this json file')
+    argumentparser.add_argument('--stages', action='store_true',
+                                help='print how many lexical assignments each stage of the parse eliminated')
+    options = argumentparser.parse_args(arguments)
+    lexiconfilename = options.lexicon or lexiconpath(options.language)
+    sentencefilename = options.sentences or sentencepath(options.language)
+
+    with open(sentencefilename, 'r', encoding='utf-8') as sentencefile:
+        sentencelist = [line for line in sentencefile.read().split('\n') if line != '']
+    profiling = options.profile or options.profilefile is not None
+    sentenceprofiles = []
+
+    if options.checkfocused:
+        lexiconsource = lexiconservice.get(lexiconfilename, options.lexiconcache, options.backoff)
+        differences, fullcounts, focusedcounts = checkfocused(lexiconsource, sentencelist, options.qrlimit,
+                                                              options.cooldown)
+        for sentence, fullonly, focusedonly in differences:
+            print(sentence, '  full search only:', fullonly, '  focused search only:', focusedonly)
+        print(len(sentencelist), 'sentences,', len(differences), 'with different readings')
+        print('full search:', fullcounts[0], 'sequents,', fullcounts[1], 'derivations')
+        print('focused search:', focusedcounts[0], 'sequents,', focusedcounts[1], 'derivations')
+    elif options.checkproofnets:
+        lexiconsource = lexiconservice.get(lexiconfilename, options.lexiconcache, options.backoff)
+        differences, sequentcounts, proofnetcounts = checkproofnets(lexiconsource, sentencelist, options.cooldown)
+        for sentence, sequentonly, proofnetonly in differences:
+            print(sentence, '  sequent engine only:', sequentonly, '  proof-net engine only:', proofnetonly)
+        print(len(sentencelist), 'sentences,', len(differences), 'with different readings')
+        print('sequent engine:', sequentcounts[0], 'sequents,', sequentcounts[1], 'derivations')
+        print('proof-net engine:', proofnetcounts[0], 'spans,', proofnetcounts[1], 'derivations')
+    elif options.checkprefilter is not None:
+        lexiconsource = lexiconservice.get(lexiconfilename, options.lexiconcache, options.backoff)
+        falserejections, rejected, unfinished = checkprefilter(lexiconsource, options.checkprefilter,
+                                                               qrlimit=options.qrlimit, cooldownperiod=options.cooldown,
+                                                               engine=options.engine)
+        for sequenttypes, goaltype in falserejections:
+            print('rejected but proven:', ', '.join(map(str, sequenttypes)), '⊦', goaltype)
+        print(options.checkprefilter, 'sequents,', rejected, 'rejected,', len(falserejections), 'of them proven,',
+              unfinished, 'not finished')
+    elif options.batch:
+        totals = None
+        for result in parsebatch(lexiconfilename, sentencelist, options.processes, options.timeout, options.qrlimit,
+                                 options.cooldown, not options.keepduplicates, options.lexiconcache,
+                                 options.backoff, options.nodebudget, options.timebudget, options.deepening,
+                                 options.firstproof, options.maxreadings, options.focused, options.prefilter,
+                                 options.engine, profiling):
+            print(result)
+            if options.stages and result.stages is not None:
+                totals = addstages(totals, result.stages)
+            if result.profile is not None:
+                sentenceprofiles.append((result.sentence, RuleProfile.fromdict(result.profile)))
+                if options.profile:
+                    sentenceprofiles[-1][1].print()
+        if options.stages:
+            printstages('all sentences', totals)
+        if profiling:
+            printprofiles(sentenceprofiles, options.profilefile)
     else:
-        chart = Chart(lexiconsource, line)
-    print(chart, '  ', chart.isvalid)
-    chart.printstructure()
+        totals = None
+        lexiconsource = lexiconservice.get(lexiconfilename, options.lexiconcache, options.backoff)
+        for line in sentencelist:
+            chart = Chart.parse(lexiconsource, line,
+                                ParseContext(options.qrlimit, options.cooldown, not options.keepduplicates,
+                                             options.nodebudget, options.timebudget, options.deepening,
+                                             options.firstproof, options.maxreadings, options.focused,
+                                             options.prefilter, options.engine, profiling))
+            print(chart, '  ', chart.isvalid)
+            if chart.truncated:
+                print('search truncated')
+            if len(chart.unknownwords) > 0:
+                print('unknown words:', ' '.join(chart.unknownwords))
+            chart.printstructure()
+            if options.stages:
+                printstages(line, chart.stages())
+                totals = addstages(totals, chart.stages())
+            if profiling:
+                sentenceprofiles.append((line, chart.context.profile))
+                if options.profile:
+                    chart.context.profile.print()
+        if options.stages:
+            printstages('all sentences', totals)
+        if profiling:
+            printprofiles(sentenceprofiles, options.profilefile)
+
+
+if __name__ == '__main__':
+    main()
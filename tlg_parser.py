@@ -1,8 +1,14 @@
-"""Lambek parser"""
+"""Lambek parser
 
-from collections import defaultdict
+Load a lexicon with Lexicon or Lexicon.from_file and parse with Chart.parse; nothing is parsed when the module is
+imported. Run the module to parse sentences with the test lexicon (python tlg_parser.py --help for the options)."""
 
+from collections import defaultdict, deque
+import argparse
+import threading
 
+
+# the semantic type of each atomic syntactic type, used by a lexicon unless it is given its own
 semantictypelist = {
     'dp': 'e',
     's': 't',
@@ -44,24 +50,25 @@ def stripbrackets(inputstring):
 # elimination rules, returns None if cannot combine
 def leftelimination(type1, type2):
     if type2.slashtype == 'left':
-        if type2.left.typestring == type1.typestring:
+        if type2.left is type1:
             return type2.right
 
 
 def rightelimination(type1, type2):
     if type1.slashtype == 'right':
-        if type1.right.typestring == type2.typestring:
+        if type1.right is type2:
             return type1.left
 
 
-def elimination(left, right):
-    result = leftelimination(left.syntactictype, right.syntactictype)
+# the type of two adjacent types combined and the rule that combines them, or None, None if they cannot combine
+def elimination(lefttype, righttype):
+    result = leftelimination(lefttype, righttype)
     if result is not None:
-        return result, functionapplication(right.denotation, left.denotation)
+        return result, '\\E'
     else:
-        result = rightelimination(left.syntactictype, right.syntactictype)
+        result = rightelimination(lefttype, righttype)
         if result is not None:
-            return result, functionapplication(left.denotation, right.denotation)
+            return result, '/E'
         else:
             return None, None
 
@@ -74,33 +81,88 @@ def functionapplication(function, argument):
         raise Exception("Function application cannot be applied.")
 
 
-class SyntacticType:
+# types are made with maketype, which parses each type string only once and builds each distinct type only once, so
+# that two types are equal exactly when they are the same object
+# the tables are shared by every parse, so new types are only added while holding typelock
+parsecache = {}  # type strings that were already parsed, and their type
+typetable = {}  # canonical string of every type that was built, and the type
+typelock = threading.RLock()
+
+
+def maketype(inputstring):
+    if inputstring in parsecache:
+        return parsecache[inputstring]
+    with typelock:
+        return buildtype(inputstring)
+
+
+def buildtype(inputstring):
+    if inputstring in parsecache:
+        return parsecache[inputstring]
+
+    typestring = stripbrackets(inputstring.replace(' ', ''))
+    slashindex = None
+    slashtype = None
+    # right now, assumes that everything is properly bracketed!!
+    if '\\' in typestring or '/' in typestring:
+        searchindex = 0
+        while slashindex is None:
+            if typestring[searchindex] == '(':
+                searchindex = findbracketpair(typestring, searchindex) + 1
+            elif typestring[searchindex] == '\\':
+                slashindex = searchindex
+                slashtype = 'left'
+            elif typestring[searchindex] == '/':
+                slashindex = searchindex
+                slashtype = 'right'
+            else:
+                searchindex += 1
+            if searchindex >= len(typestring):
+                raise Exception("Invalid type: {}".format(typestring))
 
-    def __init__(self, inputstring):
-        self.typestring = stripbrackets(inputstring.replace(' ', ''))
-        self.isfunction = '\\' in self.typestring or '/' in self.typestring
-        self.slashindex = None
-        self.slashtype = None
+    if slashtype is None:
+        syntactictype = atomtype(typestring)
+    else:
+        syntactictype = functiontype(slashtype, buildtype(typestring[:slashindex]),
+                                     buildtype(typestring[slashindex + 1:]))
+
+    parsecache[inputstring] = syntactictype
+    return syntactictype
 
-        # right now, assumes that everything is properly bracketed!!
-        if self.isfunction:
-            searchindex = 0
-            while self.slashindex is None:
-                if self.typestring[searchindex] == '(':
-                    searchindex = findbracketpair(self.typestring, searchindex) + 1
-                elif self.typestring[searchindex] == '\\':
-                    self.slashindex = searchindex
-                    self.slashtype = 'left'
-                elif self.typestring[searchindex] == '/':
-                    self.slashindex = searchindex
-                    self.slashtype = 'right'
-                else:
-                    searchindex += 1
-                if searchindex >= len(self.typestring):
-                    raise Exception("Invalid type: {}".format(self.typestring))
 
-            self.left = SyntacticType(self.typestring[:self.slashindex])
-            self.right = SyntacticType(self.typestring[self.slashindex + 1:])
+# the type of an atom, or of a function from its parts; these are only called while holding typelock
+def atomtype(typestring):
+    syntactictype = typetable.get(typestring)
+    if syntactictype is None:
+        syntactictype = typetable[typestring] = SyntacticType(typestring)
+    return syntactictype
+
+
+def functiontype(slashtype, left, right):
+    typestring = bracket(left) + ('\\' if slashtype == 'left' else '/') + bracket(right)
+    syntactictype = typetable.get(typestring)
+    if syntactictype is None:
+        syntactictype = typetable[typestring] = SyntacticType(typestring, slashtype, left, right)
+    return syntactictype
+
+
+def bracket(syntactictype):
+    if syntactictype.isfunction:
+        return '(' + syntactictype.typestring + ')'
+    else:
+        return syntactictype.typestring
+
+
+class SyntacticType:
+
+    # use maketype rather than building types directly
+    def __init__(self, typestring, slashtype=None, left=None, right=None):
+        self.typestring = typestring
+        self.isfunction = slashtype is not None
+        self.slashtype = slashtype
+        if self.isfunction:
+            self.left = left
+            self.right = right
 
     def print(self):
         if self.isfunction:
@@ -119,18 +181,18 @@ class SyntacticType:
 
 class Semantictype:
 
-    def __init__(self, syntactictype):
+    def __init__(self, syntactictype, semantictypes):
         self.syntactictype = syntactictype
 
         if not self.syntactictype.isfunction:
-            self.typestring = semantictypelist[self.syntactictype.typestring]
+            self.typestring = semantictypes[self.syntactictype.typestring]
         else:
             if self.syntactictype.slashtype == 'left':
-                self.argument = Semantictype(self.syntactictype.left)
-                self.goal = Semantictype(self.syntactictype.right)
+                self.argument = Semantictype(self.syntactictype.left, semantictypes)
+                self.goal = Semantictype(self.syntactictype.right, semantictypes)
             else:
-                self.argument = Semantictype(self.syntactictype.right)
-                self.goal = Semantictype(self.syntactictype.left)
+                self.argument = Semantictype(self.syntactictype.right, semantictypes)
+                self.goal = Semantictype(self.syntactictype.left, semantictypes)
             self.typestring = '(' + self.argument.typestring + ',' + self.goal.typestring + ')'
 
     def __repr__(self):
@@ -160,106 +222,283 @@ class Denotation:
         return self.string
 
 
+# semantictypes maps each atomic syntactic type to its semantic type (semantictypelist by default)
+# a word can have several entries, kept in the order they are listed
 class Lexicon:
 
-    def __init__(self, lexiconstring):
-        self.entrytypes = defaultdict(SyntacticType)
-        self.entrydenotations = defaultdict(Denotation)
+    def __init__(self, lexiconstring, semantictypes=None):
+        if semantictypes is None:
+            self.semantictypes = semantictypelist
+        else:
+            self.semantictypes = semantictypes
+        self.entrytypes = defaultdict(list)
+        self.entrydenotations = defaultdict(list)
         for entry in lexiconstring.split('\n'):
+            if entry.strip() == '' or entry.strip()[0] == '#':
+                continue
             colonindex = entry.index(':')
             dashindex = entry.index('-')
             entryname = entry[:colonindex].strip()
-            self.entrytypes[entryname] = SyntacticType(entry[colonindex + 1:dashindex])
-            self.entrydenotations[entryname] = Denotation(Semantictype(self.entrytypes[entryname]),
-                                                          entry[dashindex + 1:].strip())
+            entrytype = maketype(entry[colonindex + 1:dashindex])
+            self.entrytypes[entryname].append(entrytype)
+            self.entrydenotations[entryname].append(Denotation(Semantictype(entrytype, self.semantictypes),
+                                                               entry[dashindex + 1:].strip()))
+
+    @classmethod
+    def from_file(cls, filename, semantictypes=None):
+        with open(filename, 'r', encoding='utf-8') as lexiconfile:
+            return cls(lexiconfile.read().strip('\n'), semantictypes)
 
     def print(self):
         for entry in self.entrytypes:
             print(entry, ':', self.entrytypes[entry], '-', self.entrydenotations[entry])
 
 
+# a constituent is a packed cell of the chart, with every analysis of one type over one span, so ambiguity below it
+# adds analyses to the cell instead of more constituents
+# constituents, analyses and trees have __slots__, since a long sentence has very many of them
 class Constituent:
 
-    def __init__(self, syntactictype, denotation, startposition, endposition=None, subconstituents=None):
+    __slots__ = ('syntactictype', 'semantictype', 'start', 'end', 'length', 'analyses', 'denotations', 'parsecount')
+
+    def __init__(self, syntactictype, semantictype, startposition, endposition=None):
         self.syntactictype = syntactictype
-        self.semantictype = Semantictype(self.syntactictype)
-        self.denotation = denotation
+        self.semantictype = semantictype
         self.start = startposition
         if endposition is None:
             self.end = self.start + 1
         else:
             self.end = endposition
         self.length = self.end - self.start
-        if subconstituents is None:
-            self.subconstituents = []
-        else:
-            self.subconstituents = subconstituents
+        self.analyses = []
+        self.denotations = None
+        self.parsecount = None
+
+    def addanalysis(self, analysis):
+        self.analyses.append(analysis)
+
+    # the denotation of every parse, made on first use and kept
+    def getdenotations(self):
+        if self.denotations is None:
+            self.denotations = [denotation for analysis in self.analyses for denotation in analysis.denotations()]
+        return self.denotations
+
+    # the number of parses, without unpacking them
+    def countparses(self):
+        if self.parsecount is None:
+            self.parsecount = sum(analysis.countparses() for analysis in self.analyses)
+        return self.parsecount
+
+    # every parse in turn, as a tree
+    def trees(self):
+        for analysis in self.analyses:
+            if analysis.rule == 'LEX':
+                yield Tree(self, analysis.denotation)
+            else:
+                left, right = analysis.subconstituents
+                for lefttree in left.trees():
+                    for righttree in right.trees():
+                        yield Tree(self, analysis.combine(lefttree.denotation, righttree.denotation),
+                                   [lefttree, righttree])
 
     def print(self):
-        print(self.syntactictype, self.semantictype, self.denotation, str(self.start), ":", str(self.end))
+        print(self.syntactictype, self.semantictype, self.getdenotations(), str(self.start), ":", str(self.end))
+
+    def __repr__(self):
+        return self.syntactictype.typestring + ' ' + self.semantictype.typestring + ' ' + \
+            str(self.start) + ':' + str(self.end)
+
+
+# a back-pointer of a constituent: the rule of one of its analyses (LEX for a word, with its denotation) and the two
+# adjacent constituents it was combined from
+class Analysis:
+
+    __slots__ = ('rule', 'subconstituents', 'denotation')
+
+    def __init__(self, rule, subconstituents=(), denotation=None):
+        self.rule = rule
+        self.subconstituents = subconstituents
+        self.denotation = denotation
+
+    def combine(self, leftdenotation, rightdenotation):
+        if self.rule == '\\E':
+            return functionapplication(rightdenotation, leftdenotation)
+        else:
+            return functionapplication(leftdenotation, rightdenotation)
+
+    def denotations(self):
+        if self.rule == 'LEX':
+            yield self.denotation
+        else:
+            left, right = self.subconstituents
+            for leftdenotation in left.getdenotations():
+                for rightdenotation in right.getdenotations():
+                    yield self.combine(leftdenotation, rightdenotation)
+
+    def countparses(self):
+        count = 1
+        for subconstituent in self.subconstituents:
+            count *= subconstituent.countparses()
+        return count
+
+
+# one parse of a constituent, with its denotation and the parses of the constituents it was made from
+class Tree:
+
+    __slots__ = ('constituent', 'denotation', 'subtrees')
+
+    def __init__(self, constituent, denotation, subtrees=None):
+        self.constituent = constituent
+        self.denotation = denotation
+        if subtrees is None:
+            self.subtrees = []
+        else:
+            self.subtrees = subtrees
 
     def returnchart(self, layer=0, lines=None, maxwordlength=14):
         if lines is None:
             lines = []
-        dashlength = (maxwordlength + 1) * self.length - 1 - len(self.syntactictype.typestring)
+        constituent = self.constituent
+        dashlength = (maxwordlength + 1) * constituent.length - 1 - len(constituent.syntactictype.typestring)
         if len(lines) < layer + 1:
             lines.append('')
-        while len(lines[layer]) < self.start * (maxwordlength + 1):
+        while len(lines[layer]) < constituent.start * (maxwordlength + 1):
             lines[layer] += ' ' * (maxwordlength + 1)
-        lines[layer] += self.syntactictype.typestring + '-' * dashlength + ' '
-        for subconstituent in self.subconstituents:
-            subconstituent.returnchart(layer + 1, lines, maxwordlength)
+        lines[layer] += constituent.syntactictype.typestring + '-' * dashlength + ' '
+        for subtree in self.subtrees:
+            subtree.returnchart(layer + 1, lines, maxwordlength)
         if layer == 0:
             return lines
 
     def __repr__(self):
-        return self.syntactictype.typestring + ' ' + self.semantictype.typestring + ' ' + self.denotation.string
+        return repr(self.constituent.syntactictype) + ' ' + repr(self.denotation)
 
 
+# there is one constituent for each span and type, found in cells
+# constituents are indexed by the position they end at, and the constituents ending at a position by their type (for a
+# functor looking left for its argument) and, if they look right, by the type of their argument, so a new constituent
+# is only tried against the adjacent constituents it can combine with
+# words are read one at a time with feed, and every constituent a word adds ends after it, so the constituents ending
+# at a position never change once it is read: the chart can be asked after each word which types span what it has
+# read so far, and a snapshot can share the cells of the positions read with the chart it was made from
 class Chart:
 
-    def __init__(self, lexicon, sentence):
+    def __init__(self, lexicon, sentence=None):
         self.lexicon = lexicon
-        self.words = sentence.split(' ')
-        self.agenda = []
-        self.constituents = []
+        self.words = []
+        self.agenda = deque()
+        self.cells = [{}]  # for each end position, each constituent ending there by (start, type)
+        self.byend = [[]]
+        self.byendtype = [defaultdict(list)]
+        self.byendargument = [defaultdict(list)]
         self.position = 0
 
-        while self.position < len(self.words):
-            self.interpretword()
-            while len(self.agenda) > 0:
-                self.addconstituent(self.agenda[0])
-                self.agenda.pop(0)
-            self.position += 1
+        if sentence is not None:
+            for word in sentence.split(' '):
+                self.feed(word)
+
+    @classmethod
+    def parse(cls, lexicon, sentence):
+        return cls(lexicon, sentence)
+
+    # reads one more word, adding the constituents that end after it
+    def feed(self, word):
+        self.words.append(word)
+        self.cells.append({})
+        self.byend.append([])
+        self.byendtype.append(defaultdict(list))
+        self.byendargument.append(defaultdict(list))
+        self.interpretword()
+        while len(self.agenda) > 0:
+            self.addconstituent(self.agenda.popleft())
+        self.position += 1
+
+    # a chart with the words read so far, which can be fed apart from this one
+    def snapshot(self):
+        chart = Chart(self.lexicon)
+        chart.words = list(self.words)
+        chart.cells = list(self.cells)
+        chart.byend = list(self.byend)
+        chart.byendtype = list(self.byendtype)
+        chart.byendargument = list(self.byendargument)
+        chart.position = self.position
+        return chart
+
+    # every constituent, in the order they were found
+    @property
+    def constituents(self):
+        return [constituent for constituents in self.byend for constituent in constituents]
+
+    # the constituents from start to the last word read, so with start 0 those spanning everything read so far
+    def spanning(self, start=0):
+        return [constituent for constituent in self.byend[self.position] if constituent.start == start]
 
     def interpretword(self):
-        self.agenda.append(Constituent(self.lexicon.entrytypes[self.words[self.position]],
-                                       self.lexicon.entrydenotations[self.words[self.position]], self.position))
+        word = self.words[self.position]
+        for entrytype, denotation in zip(self.lexicon.entrytypes.get(word, []),
+                                         self.lexicon.entrydenotations.get(word, [])):
+            self.addanalysis(self.position, self.position + 1, entrytype, denotation.semantictype,
+                             Analysis('LEX', denotation=denotation))
+
+    # adds an analysis to the constituent of its span and type; a new constituent goes on the agenda, while an analysis
+    # of a constituent that was already found combines with nothing new
+    def addanalysis(self, start, end, syntactictype, semantictype, analysis):
+        constituent = self.cells[end].get((start, syntactictype))
+        if constituent is None:
+            constituent = self.cells[end][(start, syntactictype)] = Constituent(syntactictype, semantictype, start,
+                                                                                end)
+            self.agenda.append(constituent)
+        constituent.addanalysis(analysis)
 
     def addconstituent(self, constituent):
-        # add constituent
-        self.constituents.append(constituent)
-
-        '''are arcs needed?'''
-
         # try adding constituent immediately (every rule is binary branching)
         # calling it an arc but it is really just a constituent, since a single constituent is one constituent
         # away from being a completed arc
-        for arc in self.constituents:
-            if arc.end == constituent.start:
-                syntacticcombo, denotationcombo = elimination(arc, constituent)
-                if syntacticcombo is not None:
-                    self.agenda.append(Constituent(syntacticcombo, denotationcombo, arc.start, constituent.end, [arc, constituent]))
+        # words are read left to right, so every constituent it can combine with ends where it starts: either a
+        # functor looking right for its type, or (if it looks left) its argument
+        syntactictype = constituent.syntactictype
+        arcs = self.byendargument[constituent.start].get(syntactictype, [])
+        if syntactictype.slashtype == 'left':
+            arcs = arcs + self.byendtype[constituent.start].get(syntactictype.left, [])
+        for arc in arcs:
+            syntacticcombo, rule = elimination(arc.syntactictype, syntactictype)
+            if syntacticcombo is not None:
+                if rule == '\\E':
+                    semanticcombo = constituent.semantictype.goal
+                else:
+                    semanticcombo = arc.semantictype.goal
+                self.addanalysis(arc.start, constituent.end, syntacticcombo, semanticcombo,
+                                 Analysis(rule, (arc, constituent)))
+
+        # add constituent
+        self.byend[constituent.end].append(constituent)
+        self.byendtype[constituent.end][syntactictype].append(constituent)
+        if syntactictype.slashtype == 'right':
+            self.byendargument[constituent.end][syntactictype.right].append(constituent)
+
+    # the constituent of a type over a span, or None
+    def cell(self, start, end, syntactictype):
+        if end > self.position:
+            return None
+        return self.cells[end].get((start, maketype(syntactictype) if isinstance(syntactictype, str) else
+                                    syntactictype))
+
+    # the number of parses of the whole sentence as a type (s by default), without unpacking them
+    def countparses(self, syntactictype='s'):
+        constituent = self.cell(0, len(self.words), syntactictype)
+        if constituent is None:
+            return 0
+        return constituent.countparses()
 
     def printconstituents(self):
         for constituent in self.constituents:
             constituent.print()
 
     def printstructure(self, maxwordlength=14):
-        for constituent in self.constituents:
-            if constituent.syntactictype.typestring == 's' and constituent.start == 0 and \
-                    constituent.end == len(self.words):
-                chartstructure = constituent.returnchart(0, [], maxwordlength)
+        constituent = self.cell(0, len(self.words), 's')
+        if constituent is not None:
+            for tree in constituent.trees():
+                chartstructure = tree.returnchart(0, [], maxwordlength)
                 for line in chartstructure:
                     print(line)
                 for word in self.words:
@@ -267,7 +506,7 @@ class Chart:
                 print('\n')
 
 
-lexiconsource = '''john : dp - j
+testlexiconstring = '''john : dp - j
 snores: dp\\s - L1.snore(1)
 walter : dp - w
 kevin : dp - k
@@ -280,15 +519,38 @@ everyone : s/(dp\\s) - L1.Ax:1(x)&person(x)'''
 # TODO: add a way to check if function application still applies (multiple times) ex. everyone
 # TODO: add a global variable counter to avoid alpha conversion
 
+testsentences = ['everyone knowsthat kevin snores faintly', 'kevin snores faintly']
 
-testlexicon = Lexicon(lexiconsource)
-# testlexicon.print()
 
-testchart = Chart(testlexicon, 'everyone knowsthat kevin snores faintly')
-testchart.printstructure(15)
-testchart.printconstituents()
+def main(arguments=None):
+    argumentparser = argparse.ArgumentParser(description='Parse sentences with the Lambek elimination rules.')
+    argumentparser.add_argument('sentences', nargs='*',
+                                default=testsentences,
+                                help='sentences to parse (default: two test sentences)')
+    argumentparser.add_argument('--lexicon', help='lexicon file (default: the test lexicon)')
+    argumentparser.add_argument('--maxwordlength', type=int, default=15, help='column width of the printed chart')
+    argumentparser.add_argument('--prefixes', action='store_true',
+                                help='read each sentence a word at a time, printing the types spanning what was read')
+    options = argumentparser.parse_args(arguments)
+
+    if options.lexicon is None:
+        testlexicon = Lexicon(testlexiconstring)
+    else:
+        testlexicon = Lexicon.from_file(options.lexicon)
+    # testlexicon.print()
+
+    for sentence in options.sentences:
+        if options.prefixes:
+            testchart = Chart(testlexicon)
+            for word in sentence.split(' '):
+                testchart.feed(word)
+                print(' '.join(testchart.words), ':',
+                      ', '.join(constituent.syntactictype.typestring for constituent in testchart.spanning()))
+        else:
+            testchart = Chart.parse(testlexicon, sentence)
+        testchart.printstructure(options.maxwordlength)
+        testchart.printconstituents()
 
-testchart2 = Chart(testlexicon, 'kevin snores faintly')
-testchart2.printstructure(15)
-testchart2.printconstituents()
 
+if __name__ == '__main__':
+    main()